@@ -0,0 +1,194 @@
+"""Async implementations of the hottest read endpoints.
+
+Used in ASGI mode (`DJANGO_ASGI=True`) instead of the DRF viewsets for safe
+methods: data is fetched with the async ORM, so a worker keeps serving other
+requests while waiting for the database. Other methods are passed to the
+regular DRF views.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.csrf import csrf_exempt
+from django_filters.utils import translate_validation
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.counts import get_count
+from recipes.models import Ingredient, Recipe
+
+from api.filters import NameFilterSet, RecipeFilterSet
+from api.fragments import arender
+from api.pagination import PageNumberSizedPagination
+from api.serializers import IngredientSerializer
+from api.views import IngredientViewSet, RecipeViewSet
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    """Render `data` the same way DRF's `JSONRenderer` does."""
+    return HttpResponse(JSONRenderer().render(data), status=status_code,
+                        content_type='application/json')
+
+
+def error_response(exc):
+    """Render `exc` like DRF's default exception handler."""
+    data = (exc.detail if isinstance(exc.detail, (list, dict))
+            else {'detail': exc.detail})
+    response = json_response(data, exc.status_code)
+    if isinstance(exc, exceptions.AuthenticationFailed):
+        response['WWW-Authenticate'] = 'Token'
+    return response
+
+
+def not_found(model):
+    """Return the same 404 as `get_object_or_404()` in the DRF views."""
+    return exceptions.NotFound(
+        f'No {model._meta.object_name} matches the given query.'
+    )
+
+
+async def authenticate(request):
+    """Set `request.user` from the `Authorization: Token <key>` header."""
+    request.user = AnonymousUser()
+    auth = request.headers.get('Authorization', '').split()
+    if not auth or auth[0].lower() != 'token':
+        return
+    # Same checks and messages as DRF's `TokenAuthentication`.
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+    token = await (Token.objects.select_related('user')
+                   .filter(key=auth[1]).afirst())
+    if not token:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    request.user = token.user
+
+
+def throttle(request):
+    """Apply the default DRF throttles, they only touch the cache."""
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            raise exceptions.Throttled(throttle.wait())
+
+
+def filter_queryset(filterset):
+    """Return the filtered queryset, 400 on invalid params like DRF does."""
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
+
+
+def async_read(sync_view):
+    """Serve GET/HEAD with the decorated coroutine, the rest with DRF."""
+    def decorator(async_view):
+        @csrf_exempt
+        @wraps(async_view)
+        async def view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_to_async(sync_view)(request, *args,
+                                                      **kwargs)
+            try:
+                await authenticate(request)
+                throttle(request)
+                return await async_view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+        return view
+    return decorator
+
+
+async def paginate(request, queryset, count_options=None):
+    """Return a `PageNumberSizedPagination`-compatible page of objects.
+
+    The count is cached or estimated with `count_options`, see
+    `recipes.counts.get_count()`.
+    """
+    paginator = PageNumberSizedPagination()
+    page_size = paginator.get_page_size(Request(request))
+    if count_options is None:
+        count, approximate = await queryset.acount(), False
+    else:
+        count, approximate = await sync_to_async(get_count)(
+            queryset, **count_options,
+        )
+    pages = max(1, -(-count // page_size))
+    try:
+        number = int(request.GET.get(paginator.page_query_param, 1))
+    except ValueError:
+        number = 0
+    if not 1 <= number <= pages:
+        raise exceptions.NotFound(paginator.invalid_page_message.format(
+            page_number=number, message='',
+        ))
+    offset = (number - 1) * page_size
+    objects = [obj async for obj in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    param = paginator.page_query_param
+    previous = (None if number == 1
+                else remove_query_param(url, param) if number == 2
+                else replace_query_param(url, param, number - 1))
+    return objects, {
+        'count': count,
+        'count_is_approximate': approximate,
+        'next': (replace_query_param(url, param, number + 1)
+                 if number < pages else None),
+        'previous': previous,
+    }
+
+
+@async_read(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def recipe_list(request):
+    queryset = filter_queryset(RecipeFilterSet(
+        request.GET, queryset=Recipe.objects.for_fragments(request.user),
+        request=request,
+    ))
+    recipes, page = await paginate(request, queryset,
+                                   RecipeViewSet.count_options(request.GET,
+                                                               request.user))
+    return json_response({**page,
+                          'results': await arender(recipes, request)})
+
+
+@async_read(RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy',
+}))
+async def recipe_detail(request, pk):
+    recipe = await (Recipe.objects.for_fragments(request.user)
+                    .filter(pk=pk).afirst())
+    data = await arender([recipe], request) if recipe else None
+    if not data:
+        raise not_found(Recipe)
+    return json_response(data[0])
+
+
+@async_read(IngredientViewSet.as_view({'get': 'list'}))
+async def ingredient_list(request):
+    filterset = NameFilterSet(request.GET, queryset=Ingredient.objects.all())
+    if request.GET.get('search'):
+        # The search index may need loading from the DB.
+        queryset = await sync_to_async(filter_queryset)(filterset)
+    else:
+        queryset = filter_queryset(filterset)
+    return json_response([
+        ingredient async for ingredient in
+        queryset.values(*IngredientSerializer.Meta.fields)
+    ])
+
+
+@async_read(IngredientViewSet.as_view({'get': 'retrieve'}))
+async def ingredient_detail(request, pk):
+    ingredient = await (Ingredient.objects.filter(pk=pk)
+                        .values(*IngredientSerializer.Meta.fields).afirst())
+    if ingredient is None:
+        raise not_found(Ingredient)
+    return json_response(ingredient)
@@ -1,16 +1,45 @@
+from django import forms
+from django.db.models import Exists, F, OuterRef
 from django_filters import rest_framework as filters
+from django_filters.widgets import BaseCSVWidget
 
-from recipes.models import Ingredient, Recipe
+from recipes.ingredient_search import search_ingredients
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+
+
+class ListWidget(BaseCSVWidget, forms.TextInput):
+    """Values of a repeated parameter, each may be comma-separated."""
+
+    def value_from_datadict(self, data, files, name):
+        if name not in data:
+            return None
+        values = (data.getlist(name) if hasattr(data, 'getlist')
+                  else [data[name]])
+        return [x for value in values for x in value.split(',') if x]
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Filter by a list of numbers."""
 
 
 class NameFilterSet(filters.FilterSet):
-    """Filterset for ingredients. Filter by ingredient name."""
+    """Filterset for ingredients.
+
+    Filter ingredients by:
+    - `name`: string - the beginning of the ingredient name;
+    - `search`: string - typo-tolerant search, best matches first.
+    """
 
     name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Ingredient
-        fields = ('name',)
+        fields = ('name', 'search')
+
+    def filter_search(self, queryset, name, value):
+        """Find ingredients by trigram similarity, limited and ranked."""
+        return search_ingredients(queryset, value)
 
 
 class RecipeFilterSet(filters.FilterSet):
@@ -19,7 +48,12 @@ class RecipeFilterSet(filters.FilterSet):
     Filter recipes by:
     - `is_favorited`: 0/1 - whether the recipe is favorited by the user;
     - `is_in_shopping_cart`: 0/1 - whether the recipe is in the shopping cart;
-    - `author`: integer - ID of the author.
+    - `author`: integers - IDs of the authors, e.g. `author=1,2`;
+    - `ordering`: `trending` - popular now first, see `recipes.trending`.
+
+    The user's lists are checked with `EXISTS` subqueries on their unique
+    (user, recipe) index instead of joins: no duplicates, and `NOT EXISTS`
+    is planned as an anti-join.
     """
 
     BOOL_CHOICES = ((0, 'Нет'), (1, 'Да'))
@@ -32,17 +66,26 @@ class RecipeFilterSet(filters.FilterSet):
         choices=BOOL_CHOICES, coerce=int, method='filter_boolean',
         label='Корзина',
     )
-    author = filters.NumberFilter(field_name='author__id')
+    author = NumberInFilter(field_name='author_id', widget=ListWidget,
+                            label='Авторы')
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'Популярные'),), method='filter_ordering',
+        label='Сортировка',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'ordering')
 
     # Relation between filter name and model related field.
     related_fields = {
         'is_favorited': 'favorites',
         'is_in_shopping_cart': 'shopping_carts',
     }
+    related_models = {
+        'is_favorited': Favorite,
+        'is_in_shopping_cart': ShoppingCart,
+    }
 
     def filter_boolean(self, queryset, name, value):
         """Filter whether the recipe is in the user's lists.
@@ -51,11 +94,19 @@ class RecipeFilterSet(filters.FilterSet):
         given by `name`.
         Example: `is_favorited=1` - get favorite recipes of the user.
         """
-        field = self.related_fields.get(name)
-        if not field:
+        model = self.related_models.get(name)
+        if not model:
             return queryset
         if not self.request.user or not self.request.user.is_authenticated:
             return queryset.none()
-        lookup = {f'{field}__user': self.request.user}
-        return (queryset.filter(**lookup) if value == 1
-                else queryset.exclude(**lookup))
+        exists = Exists(model.objects.filter(
+            user=self.request.user, recipe=OuterRef('pk'),
+        ))
+        return queryset.filter(exists if value == 1 else ~exists)
+
+    def filter_ordering(self, queryset, name, value):
+        """Order by the rolled up popularity, recipes without a score
+        (no events yet or faded) last."""
+        return queryset.order_by(
+            F('trend__score').desc(nulls_last=True), '-created_at',
+        )
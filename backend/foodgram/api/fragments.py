@@ -0,0 +1,104 @@
+"""Fragment cache of recipes read through the API.
+
+Whole responses can't be cached for authenticated users: `is_favorited`,
+`is_in_shopping_cart` and the author's `is_subscribed` differ per viewer.
+Everything else `ReadRecipeSerializer` returns is the same for everyone, so
+it's cached per recipe, as of the anonymous viewer and with relative media
+URLs. A response reads only the keys and the flags of its recipes (see
+`RecipeQuerySet.for_fragments()`), fetches the fragments of a whole page
+with one `get_many` and overlays the flags; only the missing ones are
+serialized, with the queries of `for_read()`.
+
+Keys are versioned by `Recipe.updated_at`, so no worker ever has to delete
+a stale fragment: a changed recipe is looked up by a new key, old ones
+expire. Ingredient amounts only change together with their recipe (the API
+and the admin both save it); changes of an author or an ingredient move
+`updated_at` of the recipes showing them (see `recipes.signals`).
+"""
+from django.core.cache import caches
+
+from recipes.models import Recipe
+
+from api.serializers import ReadRecipeSerializer
+
+cache = caches['recipe_fragments']
+
+
+def fragment_key(recipe):
+    return f'recipe:{recipe.pk}:{recipe.updated_at.timestamp()}'
+
+
+def build(ids):
+    """Serialize the recipes, return {id: (key, fragment)}."""
+    return {
+        recipe.pk: (fragment_key(recipe), ReadRecipeSerializer(recipe).data)
+        for recipe in Recipe.objects.for_read(None).filter(pk__in=ids)
+    }
+
+
+def overlay(fragment, recipe, request):
+    """Return the fragment with the flags of the annotated recipe."""
+    author = fragment['author']
+    return {
+        **fragment,
+        'author': {
+            **author,
+            'is_subscribed': recipe.author_is_subscribed,
+            'avatar': absolute(request, author['avatar']),
+        },
+        'is_favorited': recipe.is_favorited,
+        'is_in_shopping_cart': recipe.is_in_shopping_cart,
+        'image': absolute(request, fragment['image']),
+    }
+
+
+def absolute(request, url):
+    """Return the media URL as serializers with a request do."""
+    return url and request.build_absolute_uri(url)
+
+
+def fragment_keys(recipes):
+    return {fragment_key(recipe): recipe.pk for recipe in recipes}
+
+
+def missing_ids(keys, found):
+    """Return ids of the recipes whose keys weren't found."""
+    return [pk for key, pk in keys.items() if key not in found]
+
+
+def merge(recipes, request, keys, found, built):
+    """Return `ReadRecipeSerializer` data of the recipes from cached and
+    newly built fragments. Recipes deleted since they were read are left
+    out."""
+    fragments = {keys[key]: x for key, x in found.items()}
+    fragments.update({pk: x for pk, (_, x) in built.items()})
+    return [overlay(fragments[recipe.pk], recipe, request)
+            for recipe in recipes if recipe.pk in fragments]
+
+
+def render(recipes, request):
+    """Return `ReadRecipeSerializer` data of recipes from `for_fragments()`."""
+    keys = fragment_keys(recipes)
+    found = cache.get_many(keys)
+    missing, built = missing_ids(keys, found), {}
+    if missing:
+        built = build(missing)
+        cache.set_many(dict(built.values()))
+    return merge(recipes, request, keys, found, built)
+
+
+async def arender(recipes, request):
+    """Return the same as `render()`, with the async ORM and cache API."""
+    keys = fragment_keys(recipes)
+    found = await cache.aget_many(keys)
+    missing, built = missing_ids(keys, found), {}
+    if missing:
+        built = {
+            recipe.pk: (fragment_key(recipe),
+                        ReadRecipeSerializer(recipe).data)
+            async for recipe in Recipe.objects.for_read(None).filter(
+                pk__in=missing,
+            )
+        }
+        await cache.aset_many(dict(built.values()))
+    return merge(recipes, request, keys, found, built)
@@ -0,0 +1,91 @@
+import gzip
+from pathlib import Path
+from time import perf_counter, process_time
+
+import brotli
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from foodgram import compression
+
+PATHS = ('/api/recipes/?limit=100', '/api/recipes/', '/api/ingredients/')
+# Title, Accept-Encoding, whether compressed bodies are cached.
+MODES = (
+    ('identity', '', True),
+    ('gzip', 'gzip', False),
+    ('gzip cached', 'gzip', True),
+    ('br', 'br', False),
+    ('br cached', 'br', True),
+)
+
+
+class Command(BaseCommand):
+    help = ('Report bytes and CPU time per request of API responses sent '
+            'as is, compressed and served from the cache of compressed '
+            'bodies, and sizes of the precompressed API docs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Requests per path and mode.')
+        parser.add_argument('--path', nargs='+', default=PATHS,
+                            help='API paths to request.')
+
+    @staticmethod
+    def measure(path, accept_encoding, cached, count):
+        """Return the body size and CPU and wall times (ms) per request."""
+        handler = WSGIHandler()
+        factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        size = cpu = wall = 0
+        for _ in range(count):
+            cache.clear()  # Don't hit the anonymous throttle.
+            if not cached:
+                compression.cache.clear()
+            environ = factory.get(
+                path, HTTP_ACCEPT_ENCODING=accept_encoding,
+            ).environ
+            start_cpu, start = process_time(), perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            size = len(b''.join(response))
+            response.close()
+            cpu += process_time() - start_cpu
+            wall += perf_counter() - start
+        return size, cpu / count * 1000, wall / count * 1000
+
+    def report_docs(self):
+        path = (Path(settings.BASE_DIR).parent.parent
+                / 'docs/openapi-schema.yml')
+        if not path.exists():
+            return
+        data = path.read_bytes()
+        self.stdout.write(self.style.SUCCESS(f'\n{path.name} (static)'))
+        for title, compress in (
+            ('identity', lambda x: x),
+            ('gzip -9', lambda x: gzip.compress(x, 9, mtime=0)),
+            ('br -11', lambda x: brotli.compress(x, quality=11)),
+        ):
+            start = process_time()
+            size = len(compress(data))
+            self.stdout.write(
+                f'  {title:<12} {size:>9} B   compressed once in '
+                f'{(process_time() - start) * 1000:8.2f} ms CPU'
+            )
+
+    def handle(self, *args, **options):
+        if not settings.COMPRESSION:
+            self.stdout.write(self.style.WARNING(
+                'DJANGO_COMPRESSION=False, responses are not compressed.'
+            ))
+        for path in options['path']:
+            self.measure(path, '', True, 3)  # Warm up URLConf and caches.
+            self.stdout.write(self.style.SUCCESS(f'\n{path}'))
+            for title, accept_encoding, cached in MODES:
+                size, cpu, wall = self.measure(path, accept_encoding, cached,
+                                               options['requests'])
+                self.stdout.write(
+                    f'  {title:<12} {size:>9} B   CPU {cpu:7.2f} ms   '
+                    f'wall {wall:7.2f} ms per request'
+                )
+        self.report_docs()
@@ -0,0 +1,109 @@
+import json
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from time import perf_counter
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+from django.core.management.base import BaseCommand
+
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?page=2',
+    '/api/ingredients/?name=мор',
+    '/s/1/',
+)
+
+
+class NoRedirectHandler(HTTPRedirectHandler):
+    """Don't follow short-link redirects to the frontend."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Fire concurrent requests at a running server and report '
+            'throughput and latency. Run it against the WSGI and the ASGI '
+            'mode and compare the saved results. Raise the server throttle '
+            'rates (DRF_THROTTLE_RATE_*) first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Server base URL.')
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS,
+                            help='Paths requested in a round robin.')
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=(1, 8, 32), help='Concurrency levels.')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per concurrency level.')
+        parser.add_argument('--token', help='Auth token of a user.')
+        parser.add_argument('--save', help='Save results to a JSON file.')
+        parser.add_argument('--compare',
+                            help='JSON file of a previous run to compare.')
+
+    def fetch(self, url, headers):
+        """Return the latency (ms) and the status of a GET request."""
+        start = perf_counter()
+        try:
+            with self.opener.open(Request(url, headers=headers),
+                                  timeout=30) as resp:
+                resp.read()
+                code = resp.status
+        except HTTPError as error:
+            code = error.code
+        return (perf_counter() - start) * 1000, code
+
+    def run_level(self, urls, headers, concurrency, count):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = perf_counter()
+            results = list(executor.map(
+                lambda url: self.fetch(url, headers),
+                islice(cycle(urls), count),
+            ))
+            elapsed = perf_counter() - start
+        timings = sorted(latency for latency, _ in results)
+        quantiles = statistics.quantiles(timings, n=100)
+        return {
+            'rps': round(count / elapsed, 1),
+            'p50': round(quantiles[49], 2),
+            'p95': round(quantiles[94], 2),
+            'p99': round(quantiles[98], 2),
+            'errors': sum(code >= 400 for _, code in results),
+        }
+
+    def handle(self, *args, **options):
+        self.opener = build_opener(NoRedirectHandler)
+        headers = ({'Authorization': f'Token {options["token"]}'}
+                   if options['token'] else {})
+        urls = [options['url'].rstrip('/') + quote(path, safe='/?=&')
+                for path in options['paths']]
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)
+
+        results = {}
+        for concurrency in options['concurrency']:
+            result = self.run_level(urls, headers, concurrency,
+                                    options['requests'])
+            results[str(concurrency)] = result
+            line = (f'c={concurrency:<4} {result["rps"]:8.1f} req/s   '
+                    f'p50 {result["p50"]:8.2f}   p95 {result["p95"]:8.2f}   '
+                    f'p99 {result["p99"]:8.2f} ms   '
+                    f'errors {result["errors"]}')
+            before = previous.get(str(concurrency))
+            if before:
+                line += (f'   ({result["rps"] / before["rps"]:.2f}x req/s, '
+                         f'p95 {before["p95"]:.2f} -> {result["p95"]:.2f})')
+            self.stdout.write(line)
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Saved to {options["save"]}'
+            ))
@@ -0,0 +1,107 @@
+import statistics
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+
+class Command(BaseCommand):
+    help = ('Compare request latency with a new DB connection per request '
+            'and with the configured persistent/pooled connections.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per mode.')
+        parser.add_argument('--path', default='/api/ingredients/?name=a',
+                            help='API path to request.')
+
+    @staticmethod
+    @contextmanager
+    def connection_settings(**overrides):
+        """Temporarily change the `default` connection settings."""
+        connection.close()
+        original = {key: connection.settings_dict[key] for key in overrides}
+        connection.settings_dict.update(overrides)
+        try:
+            yield
+        finally:
+            connection.close()
+            connection.settings_dict.update(original)
+
+    @staticmethod
+    def measure_connect(count):
+        """Return the times (ms) of opening a raw connection, no pool."""
+        params = connection.get_connection_params()
+        timings = []
+        for _ in range(count):
+            start = perf_counter()
+            connection.Database.connect(**params).close()
+            timings.append((perf_counter() - start) * 1000)
+        return timings
+
+    @staticmethod
+    def measure_requests(path, count):
+        """Return the times (ms) of `count` full WSGI request cycles.
+
+        The response is closed inside the timer, so `request_finished`
+        closes (or keeps) the connection just like under gunicorn.
+        """
+        handler = WSGIHandler()
+        factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        timings = []
+        for _ in range(count):
+            cache.clear()  # Don't hit the anonymous throttle.
+            environ = factory.get(path).environ
+            start = perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+            timings.append((perf_counter() - start) * 1000)
+        return timings
+
+    def report(self, title, timings):
+        timings = sorted(timings)
+        self.stdout.write(
+            f'{title:<28} mean {statistics.mean(timings):7.2f} ms   '
+            f'p50 {timings[len(timings) // 2]:7.2f} ms   '
+            f'p95 {timings[int(len(timings) * 0.95)]:7.2f} ms'
+        )
+        return statistics.mean(timings)
+
+    def handle(self, *args, **options):
+        count, path = options['requests'], options['path']
+        config = connection.settings_dict
+        pool = config['OPTIONS'].get('pool')
+        self.stdout.write(
+            f'Backend: {connection.vendor}, CONN_MAX_AGE: '
+            f'{config["CONN_MAX_AGE"]}, health checks: '
+            f'{config["CONN_HEALTH_CHECKS"]}, pool: {pool or "off"}'
+        )
+        self.report('Connection setup', self.measure_connect(count))
+
+        options_no_pool = {
+            key: value for key, value in config['OPTIONS'].items()
+            if key != 'pool'
+        }
+        with self.connection_settings(CONN_MAX_AGE=0,
+                                      OPTIONS=options_no_pool):
+            self.measure_requests(path, 5)  # Warm up URLConf and imports.
+            new = self.report('New connection per request',
+                              self.measure_requests(path, count))
+        with self.connection_settings():
+            reused = self.report('Configured (reused)',
+                                 self.measure_requests(path, count))
+
+        if not pool and not config['CONN_MAX_AGE']:
+            self.stdout.write(self.style.WARNING(
+                'Persistent connections and the pool are both disabled, '
+                'set DB_CONN_MAX_AGE or DB_POOL to see the difference.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved per request: {new - reused:.2f} ms'
+        ))
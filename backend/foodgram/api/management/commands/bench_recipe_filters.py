@@ -0,0 +1,177 @@
+import random
+import statistics
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from foodgram.constants import PAGE_SIZE_API
+from recipes.models import Favorite, Recipe, ShoppingCart, User
+
+from api.filters import RecipeFilterSet
+
+PREFIX = 'bench_filters_'
+BATCH_SIZE = 10000
+
+CASES = (
+    'is_favorited=1',
+    'is_favorited=0',
+    'is_in_shopping_cart=1',
+    'is_favorited=1&is_in_shopping_cart=0',
+    'author={author}',
+    'author={author}&is_favorited=0',
+    'author={authors}',
+)
+
+
+def legacy_filter(queryset, user, params):
+    """Filter as `RecipeFilterSet` did before: joins and one author."""
+    for name, field in (('is_favorited', 'favorites'),
+                        ('is_in_shopping_cart', 'shopping_carts')):
+        if name in params:
+            lookup = {f'{field}__user': user}
+            queryset = (queryset.filter(**lookup) if params[name] == '1'
+                        else queryset.exclude(**lookup))
+    if 'author' in params:
+        if ',' in params['author']:
+            return None  # Not supported.
+        queryset = queryset.filter(author__id=params['author'])
+    return queryset
+
+
+class Command(BaseCommand):
+    help = ('Compare plans and latency of the recipe list filters with the '
+            'former join-based ones. --seed creates a synthetic dataset '
+            '(users named bench_filters_*), --cleanup deletes it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, metavar='FAVORITES',
+                            help='Create a dataset with this many '
+                                 'favorites, e.g. 1000000.')
+        parser.add_argument('--recipes', type=int, default=20000,
+                            help='Recipes of the dataset.')
+        parser.add_argument('--per-user', type=int, default=100,
+                            help='Favorites (and half as many cart items) '
+                                 'per user of the dataset.')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the dataset.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Runs per case.')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Show EXPLAIN ANALYZE plans (PostgreSQL).')
+
+    @staticmethod
+    def bulk_insert(model, rows):
+        for start in range(0, len(rows), BATCH_SIZE):
+            model.objects.bulk_create(rows[start:start + BATCH_SIZE])
+
+    def seed(self, favorites, recipe_count, per_user):
+        user_count = max(1, favorites // per_user)
+        self.stdout.write(f'Creating {user_count} users, {recipe_count} '
+                          f'recipes, {user_count * per_user} favorites...')
+        start = perf_counter()
+        with transaction.atomic():
+            self.bulk_insert(User, [
+                User(username=f'{PREFIX}{i}', email=f'{PREFIX}{i}@x.ru',
+                     first_name='Bench', last_name='User')
+                for i in range(user_count)
+            ])
+            user_ids = list(User.objects.filter(
+                username__startswith=PREFIX,
+            ).values_list('id', flat=True))
+            self.bulk_insert(Recipe, [
+                Recipe(name=f'Bench {i}', text='Bench', cooking_time=1,
+                       image='recipes/images/bench.png',
+                       author_id=user_ids[i % len(user_ids)])
+                for i in range(recipe_count)
+            ])
+            recipe_ids = list(Recipe.objects.filter(
+                author__username__startswith=PREFIX,
+            ).values_list('id', flat=True))
+            for model, count in ((Favorite, per_user),
+                                 (ShoppingCart, per_user // 2)):
+                rows = []
+                for user_id in user_ids:
+                    rows.extend(
+                        model(user_id=user_id, recipe_id=recipe_id)
+                        for recipe_id in random.sample(recipe_ids, count)
+                    )
+                    if len(rows) >= BATCH_SIZE:
+                        model.objects.bulk_create(rows)
+                        rows = []
+                model.objects.bulk_create(rows)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(f'Done in {perf_counter() - start:.1f} s.')
+
+    def cleanup(self):
+        """Delete the dataset with plain DELETEs, without signals."""
+        users = User.objects.filter(username__startswith=PREFIX)
+        for model, field in ((Favorite, 'user'), (ShoppingCart, 'user'),
+                             (Favorite, 'recipe__author'),
+                             (ShoppingCart, 'recipe__author'),
+                             (Recipe, 'author')):
+            deleted = model.objects.filter(**{f'{field}__in': users})
+            deleted._raw_delete(deleted.db)
+        users._raw_delete(users.db)
+        self.stdout.write('Dataset deleted.')
+
+    def measure(self, queryset, repeat):
+        """Return the times (ms) of a count and a page, as the API does."""
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            queryset.count()
+            list(queryset[:PAGE_SIZE_API])
+            timings.append((perf_counter() - start) * 1000)
+        return sorted(timings)
+
+    def report(self, title, timings):
+        self.stdout.write(
+            f'  {title:<8} mean {statistics.mean(timings):8.2f} ms   '
+            f'p50 {timings[len(timings) // 2]:8.2f} ms   '
+            f'p95 {timings[int(len(timings) * 0.95)]:8.2f} ms'
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            return self.cleanup()
+        if options['seed']:
+            self.seed(options['seed'], options['recipes'],
+                      options['per_user'])
+
+        # The latest user with favorites and authors of the latest recipes.
+        user = (User.objects.filter(favorites__isnull=False)
+                .order_by('-id').first()) or AnonymousUser()
+        authors = list(Recipe.objects.values_list(
+            'author_id', flat=True,
+        ).order_by('-author_id').distinct()[:3])
+        self.stdout.write(
+            f'Backend: {connection.vendor}, recipes: '
+            f'{Recipe.objects.count()}, favorites: '
+            f'{Favorite.objects.count()}, user: {user}'
+        )
+        request = RequestFactory().get('/api/recipes/')
+        request.user = user
+        explain = ({'analyze': True}
+                   if options['analyze'] and connection.vendor == 'postgresql'
+                   else {})
+        for case in CASES:
+            query = case.format(author=authors[0] if authors else 0,
+                                authors=','.join(map(str, authors)))
+            params = QueryDict(query)
+            queryset = Recipe.objects.for_fragments(user)
+            filtered = RecipeFilterSet(params, queryset=queryset,
+                                       request=request).qs
+            legacy = legacy_filter(queryset, user, params.dict())
+            self.stdout.write(self.style.SUCCESS(f'\n{query}'))
+            for title, x in (('legacy', legacy), ('exists', filtered)):
+                if x is None:
+                    self.stdout.write(f'  {title:<8} not supported')
+                    continue
+                self.report(title, self.measure(x, options['repeat']))
+            self.stdout.write(filtered[:PAGE_SIZE_API].explain(**explain))
@@ -0,0 +1,229 @@
+import json
+import platform
+import statistics
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import (
+    override_settings, setup_databases, teardown_databases
+)
+from rest_framework.request import Request
+
+from foodgram.constants import PAGE_SIZE_API
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingCart, Subscription, User
+)
+from recipes.shopping_lists import format_text, get_contents
+
+from api.serializers import (
+    CreateRecipeSerializer, ReadRecipeSerializer, UserRecipesSerializer
+)
+
+RECIPE_SIZES = (1, 10, 100, 1000)
+INGREDIENT_SIZES = (1, 10, 100)
+BATCH_SIZE = 5000
+
+
+class Dataset:
+    """Users, ingredients and recipes the benchmarks run on."""
+
+    def __init__(self, ingredient_count):
+        User.objects.bulk_create(
+            User(username=f'bench_{i}', email=f'bench_{i}@x.ru',
+                 first_name='Bench', last_name=f'User {i}')
+            for i in range(PAGE_SIZE_API + 1)
+        )
+        self.viewer, *self.authors = User.objects.order_by('id')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ingredient {i}', measurement_unit='г')
+            for i in range(ingredient_count)
+        )
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.request = Request(RequestFactory(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0],
+        ).get('/api/recipes/'))
+        self.request.user = self.viewer
+
+    def create_recipes(self, count, ingredients=0, authors=None):
+        """Create recipes of the authors (round robin), return their ids.
+
+        Recipe `i` has `ingredients` ingredients starting from the `i`-th
+        one, so lists of several recipes share some of them.
+        """
+        authors = authors or self.authors[:1]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name=f'Recipe {i}', text='Text', cooking_time=i + 1,
+                   image='recipes/images/bench.png',
+                   author=authors[i % len(authors)])
+            for i in range(count)
+        )
+        pool = self.ingredient_ids
+        RecipeIngredient.objects.bulk_create((
+            RecipeIngredient(recipe=recipe,
+                             ingredient_id=pool[(i + k) % len(pool)],
+                             amount=k + 1)
+            for i, recipe in enumerate(recipes)
+            for k in range(ingredients)
+        ), batch_size=BATCH_SIZE)
+        return [x.pk for x in recipes]
+
+
+def read_recipe(dataset, recipes, ingredients):
+    """Serialize a list of recipes fetched by `for_read()`."""
+    ids = dataset.create_recipes(recipes, ingredients)
+    objects = list(Recipe.objects.for_read(dataset.viewer).filter(id__in=ids))
+    return lambda: ReadRecipeSerializer(
+        objects, many=True, context={'request': dataset.request},
+    ).data
+
+
+def user_recipes(dataset, recipes):
+    """Serialize a page of subscriptions, authors with `recipes` each."""
+    for author in dataset.authors:
+        dataset.create_recipes(recipes, authors=[author])
+        Subscription.objects.create(subscriber=dataset.viewer, author=author)
+    objects = list(User.objects.filter(authors__subscriber=dataset.viewer))
+    return lambda: UserRecipesSerializer(
+        objects, many=True, context={'request': dataset.request},
+    ).data
+
+
+def validate_ingredients(dataset, ingredients):
+    """Validate ingredients of a new recipe."""
+    data = [{'ingredient_id': x, 'amount': 1}
+            for x in dataset.ingredient_ids[:ingredients]]
+    return lambda: CreateRecipeSerializer.validate_ingredients(data)
+
+
+def format_shopping_list_text(dataset, recipes, ingredients):
+    """Format the text of a shopping list."""
+    date = '01.01.2025'
+    names = [(f'Recipe {i}', f'Author {i}') for i in range(recipes)]
+    rows = [{'name': f'Ingredient {i}', 'unit': 'г', 'amount': i}
+            for i in range(ingredients)]
+    return lambda: format_text(date, names, rows)
+
+
+def shopping_cart_sum(dataset, recipes, ingredients):
+    """Sum amounts of ingredients of the recipes in the cart."""
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=dataset.viewer, recipe_id=x)
+        for x in dataset.create_recipes(recipes, ingredients)
+    )
+    return lambda: get_contents(dataset.viewer.pk)
+
+
+# Name: (set-up returning the measured function, its sizes).
+BENCHMARKS = {
+    'read_recipe': (read_recipe, ('recipes', 'ingredients')),
+    'user_recipes': (user_recipes, ('recipes',)),
+    'validate_ingredients': (validate_ingredients, ('ingredients',)),
+    'format_shopping_list_text': (format_shopping_list_text,
+                                  ('recipes', 'ingredients')),
+    'shopping_cart_sum': (shopping_cart_sum, ('recipes', 'ingredients')),
+}
+
+
+def cases(name, sizes):
+    """Yield (key, {size: value}) of every combination of the sizes."""
+    combinations = [{}]
+    for size, values in sizes.items():
+        combinations = [{**x, size: value}
+                        for x in combinations for value in values]
+    for x in combinations:
+        yield (f'{name}[{",".join(f"{k}={v}" for k, v in x.items())}]', x)
+
+
+def measure(function, repeat):
+    """Return the time of a call: min and median of `repeat` runs of as
+    many calls as take 0.2 s, and the queries it makes."""
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        function()
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    timings = [x / number * 1000 for x in timer.repeat(repeat, number)]
+    return {
+        'min_ms': round(min(timings), 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'loops': number,
+        'queries': len(queries),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Run micro-benchmarks of serializers and the shopping list '
+            'across input sizes on a test database (in-memory with SQLite) '
+            'and save the results as JSON. Compare two results with '
+            'compare_benchmarks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output',
+                            help='Results file, benchmarks/<time>.json '
+                                 'by default.')
+        parser.add_argument('--only', nargs='+', choices=BENCHMARKS,
+                            help='Benchmarks to run, all by default.')
+        parser.add_argument('--recipes', type=int, nargs='+',
+                            default=RECIPE_SIZES, help='Recipe counts.')
+        parser.add_argument('--ingredients', type=int, nargs='+',
+                            default=INGREDIENT_SIZES,
+                            help='Ingredient counts (per recipe).')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per case.')
+
+    def run(self, options):
+        sizes = {'recipes': options['recipes'],
+                 'ingredients': options['ingredients']}
+        dataset = Dataset(max(sizes['ingredients']))
+        results = {}
+        for name in options['only'] or BENCHMARKS:
+            set_up, dimensions = BENCHMARKS[name]
+            for key, values in cases(name, {x: sizes[x] for x in dimensions}):
+                with transaction.atomic():
+                    results[key] = measure(set_up(dataset, **values),
+                                           options['repeat'])
+                    transaction.set_rollback(True)
+                self.stdout.write(
+                    f'{key:<60} {results[key]["min_ms"]:>12.4f} ms '
+                    f'{results[key]["queries"]:>5} queries'
+                )
+        return results
+
+    # Without DEBUG queries aren't logged, as in production.
+    @override_settings(DEBUG=False)
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False,
+                                     aliases={'default'},
+                                     serialized_aliases=set())
+        try:
+            results = self.run(options)
+            database = connection.vendor
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        path = Path(options['output'] or Path(settings.BASE_DIR) / (
+            f'benchmarks/{datetime.now():%Y%m%d-%H%M%S}.json'
+        ))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': database,
+            'repeat': options['repeat'],
+            'results': results,
+        }, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Saved to {path}.'))
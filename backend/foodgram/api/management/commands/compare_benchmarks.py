@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def load(path):
+    try:
+        return json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError) as error:
+        raise CommandError(f'Can\'t read {path}: {error}')
+
+
+class Command(BaseCommand):
+    help = ('Compare two results of bench_serializers and fail if a case '
+            'got slower by more than the threshold or makes more queries.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline', help='Results to compare with.')
+        parser.add_argument('current', help='Results to check.')
+        parser.add_argument('--threshold', type=float, default=10,
+                            help='Allowed slowdown, percent.')
+        parser.add_argument('--stat', choices=('min_ms', 'median_ms'),
+                            default='min_ms', help='Time to compare.')
+
+    def handle(self, *args, **options):
+        baseline, current = load(options['baseline']), load(options['current'])
+        for field in ('python', 'django', 'database'):
+            if baseline.get(field) != current.get(field):
+                self.stdout.write(self.style.WARNING(
+                    f'Different {field}: {baseline.get(field)} and '
+                    f'{current.get(field)}, times may not be comparable.'
+                ))
+
+        stat, threshold = options['stat'], options['threshold']
+        regressions = []
+        self.stdout.write(f'{"case":<60} {"baseline":>10} {"current":>10} '
+                          f'{"change":>8}  (ms)')
+        for key, new in current['results'].items():
+            old = baseline['results'].get(key)
+            if old is None:
+                self.stdout.write(f'{key:<60} {"-":>10} {new[stat]:>10.4f}')
+                continue
+            change = (new[stat] / old[stat] - 1) * 100 if old[stat] else 0
+            line = (f'{key:<60} {old[stat]:>10.4f} {new[stat]:>10.4f} '
+                    f'{change:>+7.1f}%')
+            if change > threshold or new['queries'] > old['queries']:
+                regressions.append(key)
+                line += (f'  queries {old["queries"]} -> {new["queries"]}'
+                         if new['queries'] > old['queries'] else '')
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        for key in baseline['results'].keys() - current['results'].keys():
+            self.stdout.write(f'{key:<60} not run')
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} case(s) slower by over '
+                               f'{threshold:g}% or with more queries: '
+                               f'{", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
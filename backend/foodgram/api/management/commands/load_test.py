@@ -0,0 +1,270 @@
+import json
+import random
+import re
+import statistics
+import threading
+from collections import defaultdict
+from pathlib import Path
+from time import perf_counter
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+User = get_user_model()
+
+COLLECTION = (Path(settings.BASE_DIR).parent.parent
+              / 'postman_collection/foodgram.postman_collection.json')
+USER_PREFIX = 'loadtest-'
+VARIABLE = re.compile(r'{{(\w+)}}')
+
+# Weighted scenarios: steps are names of the collection requests.
+# A step may be repeated with `(name, times)`, each time for another recipe.
+SCENARIOS = {
+    'browse_feed': (50, [
+        'get_recipes_list // User',
+        'get_recipe_detail // User',
+    ]),
+    'search_ingredients': (20, [
+        'get_ingredients_list_with_name_filter // User',
+        'get_ingredients_list_with_name_filter // User',
+    ]),
+    'favorite': (15, [
+        'add_to_favorite // User',
+        'get_recipes_list_with_is_favorited_param // User',
+        'remove_from_favorite // User',
+    ]),
+    'build_cart': (10, [
+        ('add_to_shopping_cart // User', 3),
+        'get_recipes_list_with_is_in_shopping_cart_param // User',
+        ('remove_from_shopping_cart // User', 3),
+    ]),
+    'download_list': (5, [
+        ('add_to_shopping_cart // User', 5),
+        'download_shopping_cart // User',
+        ('remove_from_shopping_cart // User', 5),
+    ]),
+}
+
+
+def load_requests(path):
+    """Return {name: request} of all requests in the Postman collection."""
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+    requests = {}
+
+    def walk(items):
+        for item in items:
+            if 'item' in item:
+                walk(item['item'])
+            else:
+                requests.setdefault(item['name'].strip(), item['request'])
+
+    walk(collection['item'])
+    variables = {x['key']: x['value'] for x in collection.get('variable', ())}
+    return requests, variables
+
+
+def render(request, variables):
+    """Return (method, url, headers, body) of the request template."""
+    def substitute(text):
+        return VARIABLE.sub(lambda match: str(variables[match[1]]), text)
+
+    url = request['url']['raw'] if isinstance(request['url'], dict) \
+        else request['url']
+    headers = {x['key']: substitute(x['value'])
+               for x in request.get('header', ()) if not x.get('disabled')}
+    auth = request.get('auth') or {}
+    if auth.get('type') == 'apikey':
+        options = {x['key']: x['value'] for x in auth['apikey']}
+        headers[options['key']] = substitute(options['value'])
+    body = (request.get('body') or {}).get('raw') or None
+    if body:
+        headers['Content-Type'] = 'application/json'
+        body = substitute(body).encode()
+    return (request['method'], quote(substitute(url), safe=':/?=&%'),
+            headers, body)
+
+
+def endpoint(request):
+    """Return a label like `POST /api/recipes/{firstRecipeId}/favorite/`."""
+    url = request['url']['raw'] if isinstance(request['url'], dict) \
+        else request['url']
+    path = VARIABLE.sub(r'{\1}', url.replace('{{baseUrl}}', ''))
+    return f'{request["method"]} {path.split("?")[0]}'
+
+
+def send(method, url, headers, body):
+    """Return the status code and the JSON body (if any) of the response."""
+    try:
+        with urlopen(Request(url, body, headers, method=method),
+                     timeout=60) as response:
+            status, content = response.status, response.read()
+    except HTTPError as error:
+        status, content = error.code, error.read()
+    try:
+        return status, json.loads(content)
+    except ValueError:
+        return status, None
+
+
+class Command(BaseCommand):
+    help = ('Replay weighted scenarios built from the Postman collection '
+            'against a running server and report latency per endpoint. '
+            'Raise the server throttle rates (DRF_THROTTLE_RATE_*) first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Server base URL.')
+        parser.add_argument('--collection', default=COLLECTION,
+                            help='Postman collection path.')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Virtual users running in parallel.')
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Scenarios run by each virtual user.')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                            default=list(SCENARIOS),
+                            help='Scenarios to run, with their weights.')
+        parser.add_argument('--seed', type=int, help='Random seed.')
+        parser.add_argument('--save', help='Save results to a JSON file.')
+        parser.add_argument('--keep-users', action='store_true',
+                            help="Don't delete the load test users.")
+
+    def call(self, name, variables):
+        """Send the collection request `name`, return status and data."""
+        return send(*render(self.requests[name], variables))
+
+    def set_up_user(self, number):
+        """Register a virtual user and return its variables with a token."""
+        variables = {
+            **self.variables,
+            'baseUrl': self.base_url,
+            'email': f'"{USER_PREFIX}{self.run}-{number}@example.org"',
+            'username': f'"{USER_PREFIX}{self.run}-{number}"',
+        }
+        status, data = self.call('create_first_user', variables)
+        if status != 201:
+            raise CommandError(f'Registration failed: {status} {data}')
+        status, data = self.call('get_token_for_first_user', variables)
+        if status != 200:
+            raise CommandError(f'Login failed: {status} {data}')
+        variables['userToken'] = data['auth_token']
+        variables['userId'] = data.get('id', '')
+        return variables
+
+    def collect_samples(self, variables):
+        """Return recipe ids and ingredient name prefixes to use."""
+        url = f'{self.base_url}/api/recipes/?limit=100'
+        recipe_ids = []
+        while url and len(recipe_ids) < 1000:
+            status, data = send('GET', url, {}, None)
+            if status != 200:
+                raise CommandError(f'Listing recipes failed: {status}')
+            recipe_ids += [x['id'] for x in data['results']]
+            url = data['next']
+        status, data = send('GET', f'{self.base_url}/api/ingredients/',
+                            {}, None)
+        prefixes = sorted({x['name'][:2] for x in data or ()})
+        if len(recipe_ids) < 5 or not prefixes:
+            raise CommandError('Load ingredients and create at least '
+                               '5 recipes first.')
+        return recipe_ids, prefixes
+
+    def virtual_user(self, variables, iterations, rng):
+        names = list(self.scenarios)
+        weights = [SCENARIOS[x][0] for x in names]
+        for _ in range(iterations):
+            scenario = rng.choices(names, weights)[0]
+            recipes = rng.sample(self.recipe_ids, 5)
+            variables['ingredientNameFirstLatter'] = rng.choice(
+                self.prefixes)
+            for step in SCENARIOS[scenario][1]:
+                name, times = step if isinstance(step, tuple) else (step, 1)
+                for recipe_id in recipes[:times]:
+                    variables['firstRecipeId'] = recipe_id
+                    start = perf_counter()
+                    try:
+                        status, _ = self.call(name, variables)
+                    except URLError:
+                        status = 0
+                    latency = (perf_counter() - start) * 1000
+                    with self.lock:
+                        self.results[endpoint(self.requests[name])].append(
+                            (latency, status)
+                        )
+
+    def report(self, elapsed):
+        total = sum(len(x) for x in self.results.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} requests in {elapsed:.1f} s: '
+            f'{total / elapsed:.1f} req/s'
+        ))
+        summary = {}
+        for label, samples in sorted(self.results.items()):
+            timings = sorted(latency for latency, _ in samples)
+            quantiles = (statistics.quantiles(timings, n=100)
+                         if len(timings) > 1 else timings * 99)
+            summary[label] = {
+                'requests': len(samples),
+                'rps': round(len(samples) / elapsed, 1),
+                'p50': round(quantiles[49], 2),
+                'p95': round(quantiles[94], 2),
+                'p99': round(quantiles[98], 2),
+                'errors': sum(not 200 <= code < 400 for _, code in samples),
+            }
+            x = summary[label]
+            self.stdout.write(
+                f'{label:<52} {x["requests"]:>6}  {x["rps"]:>7} req/s  '
+                f'p50 {x["p50"]:>8.2f}  p95 {x["p95"]:>8.2f}  '
+                f'p99 {x["p99"]:>8.2f} ms  errors {x["errors"]}'
+            )
+        return {'elapsed': round(elapsed, 2), 'requests': total,
+                'rps': round(total / elapsed, 1), 'endpoints': summary}
+
+    def handle(self, *args, **options):
+        self.base_url = options['url'].rstrip('/')
+        self.requests, self.variables = load_requests(options['collection'])
+        missing = {step[0] if isinstance(step, tuple) else step
+                   for x in options['scenarios'] for step in SCENARIOS[x][1]
+                   } - set(self.requests)
+        if missing:
+            raise CommandError(f'Not in the collection: {missing}')
+        self.scenarios = options['scenarios']
+        self.run = random.randrange(16 ** 6)
+        self.results = defaultdict(list)
+        self.lock = threading.Lock()
+        rng = random.Random(options['seed'])
+
+        try:
+            users = [self.set_up_user(number)
+                     for number in range(options['concurrency'])]
+            self.recipe_ids, self.prefixes = self.collect_samples(users[0])
+            threads = [
+                threading.Thread(target=self.virtual_user, args=(
+                    variables, options['iterations'],
+                    random.Random(rng.random()),
+                ))
+                for variables in users
+            ]
+            start = perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            result = self.report(perf_counter() - start)
+        finally:
+            if not options['keep_users']:
+                User.objects.filter(
+                    username__startswith=f'{USER_PREFIX}{self.run}-'
+                ).delete()
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(result, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Saved to {options["save"]}'
+            ))
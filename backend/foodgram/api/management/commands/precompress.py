@@ -0,0 +1,54 @@
+import gzip
+from pathlib import Path
+
+import brotli
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodgram.constants import COMPRESSION_MIN_BYTES
+
+SUFFIXES = {'.css', '.html', '.js', '.json', '.svg', '.txt', '.yaml', '.yml'}
+
+
+class Command(BaseCommand):
+    help = ('Write `.gz` and `.br` copies of static files (collected '
+            'static, API docs) next to them, compressed once at the best '
+            'level, for nginx `gzip_static`. Up-to-date copies are kept.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Directories, STATIC_ROOT and docs/ by default.',
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            x for x in (Path(settings.STATIC_ROOT),
+                        Path(settings.BASE_DIR).parent.parent / 'docs')
+            if x.is_dir()
+        ]
+        written = skipped = saved = 0
+        for directory in map(Path, paths):
+            for path in directory.rglob('*'):
+                if (path.suffix not in SUFFIXES or not path.is_file()
+                        or path.stat().st_size < COMPRESSION_MIN_BYTES):
+                    continue
+                data = None
+                for suffix, compress in (
+                    ('.gz', lambda x: gzip.compress(x, 9, mtime=0)),
+                    ('.br', lambda x: brotli.compress(x, quality=11)),
+                ):
+                    target = path.with_name(path.name + suffix)
+                    if (target.exists() and target.stat().st_mtime
+                            >= path.stat().st_mtime):
+                        skipped += 1
+                        continue
+                    data = data or path.read_bytes()
+                    compressed = compress(data)
+                    target.write_bytes(compressed)
+                    written += 1
+                    saved += len(data) - len(compressed)
+        self.stdout.write(self.style.SUCCESS(
+            f'Written {written} files ({saved / 1024:.0f} KiB saved), '
+            f'{skipped} up to date.'
+        ))
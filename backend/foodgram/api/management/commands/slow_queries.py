@@ -0,0 +1,62 @@
+import statistics
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodgram.slow_queries import read_log
+
+
+class Command(BaseCommand):
+    help = 'Summarize the slow query log: the worst queries by fingerprint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG,
+                            help='Slow query log path.')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Number of queries to show.')
+        parser.add_argument('--sort', default='total',
+                            choices=('total', 'count', 'max', 'p95'),
+                            help='Order of queries.')
+        parser.add_argument('--plans', action='store_true',
+                            help='Show the latest captured query plan.')
+
+    def handle(self, *args, **options):
+        groups = defaultdict(list)
+        for entry in read_log(options['log']):
+            groups[entry['fingerprint']].append(entry)
+        if not groups:
+            self.stdout.write('No slow queries logged.')
+            return
+
+        summaries = []
+        for key, entries in groups.items():
+            durations = sorted(x['duration_ms'] for x in entries)
+            summaries.append({
+                'fingerprint': key,
+                'count': len(durations),
+                'total': sum(durations),
+                'max': durations[-1],
+                'p95': durations[int(len(durations) * 0.95)],
+                'mean': statistics.mean(durations),
+                'views': Counter(x['view'] for x in entries),
+                'users': len({x['user_id'] for x in entries}),
+                'sql': entries[-1]['sql'],
+                'plan': next((x['plan'] for x in reversed(entries)
+                              if x.get('plan')), None),
+            })
+        summaries.sort(key=lambda x: x[options['sort']], reverse=True)
+
+        for i, x in enumerate(summaries[:options['top']], 1):
+            views = ', '.join(f'{view or "-"} ({count})'
+                              for view, count in x['views'].most_common(3))
+            self.stdout.write(self.style.WARNING(
+                f'{i}. [{x["fingerprint"]}] {x["count"]} times, '
+                f'total {x["total"]:.0f} ms, mean {x["mean"]:.1f} ms, '
+                f'p95 {x["p95"]:.1f} ms, max {x["max"]:.1f} ms'
+            ))
+            self.stdout.write(f'   Views: {views}; users: {x["users"]}')
+            self.stdout.write(f'   {x["sql"][:500]}')
+            if options['plans'] and x['plan']:
+                for line in x['plan'].splitlines():
+                    self.stdout.write(f'     {line}')
@@ -0,0 +1,109 @@
+import json
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)$')
+
+# Run in a fresh interpreter: load the application as a worker does.
+CHILD = '''
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+start = time.perf_counter()
+from foodgram.{module} import application
+elapsed = time.perf_counter() - start
+with open('/proc/self/status') as file:
+    rss = next(int(x.split()[1]) for x in file if x.startswith('VmRSS:'))
+print(json.dumps({{'seconds': elapsed, 'rss_kib': rss,
+                  'modules': len(sys.modules)}}))
+'''
+
+
+def memory(pid):
+    """Return {field: KiB} of `/proc/<pid>/smaps_rollup`."""
+    result = {}
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                result[name] = int(value.split()[0])
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Load the application in a fresh interpreter as a worker does '
+            'and report its start-up time, import time per package or '
+            'module and memory. With --pid report memory of running '
+            'workers instead.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--asgi', action='store_true',
+                            help='Load the ASGI application.')
+        parser.add_argument('--modules', action='store_true',
+                            help='Report modules instead of packages.')
+        parser.add_argument('--top', type=int, default=25,
+                            help='Rows to report.')
+        parser.add_argument('--pid', type=int, nargs='+',
+                            help='Report memory of these processes, e.g. '
+                                 'gunicorn workers, shared and private.')
+
+    def report_memory(self, pids):
+        self.stdout.write(f'{"pid":>8} {"rss":>10} {"pss":>10} '
+                          f'{"shared":>10} {"private":>10}  (MiB)')
+        for pid in pids:
+            try:
+                x = memory(pid)
+            except FileNotFoundError:
+                raise CommandError(f'No process {pid}.')
+            shared = x['Shared_Clean'] + x['Shared_Dirty']
+            private = x['Private_Clean'] + x['Private_Dirty']
+            self.stdout.write(
+                f'{pid:>8} {x["Rss"] / 1024:>10.1f} {x["Pss"] / 1024:>10.1f} '
+                f'{shared / 1024:>10.1f} {private / 1024:>10.1f}'
+            )
+
+    def handle(self, *args, **options):
+        if options['pid']:
+            return self.report_memory(options['pid'])
+
+        child = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             CHILD.format(module='asgi' if options['asgi'] else 'wsgi')],
+            cwd=Path(settings.BASE_DIR), capture_output=True, text=True,
+        )
+        if child.returncode:
+            raise CommandError(child.stderr[-2000:])
+        result = json.loads(child.stdout.splitlines()[-1])
+
+        # Self time, summed by package unless --modules.
+        rows = defaultdict(lambda: [0, 0, 0])  # Self, cumulative, modules.
+        for line in child.stderr.splitlines():
+            match = IMPORT_TIME.match(line)
+            if not match:
+                continue
+            own, cumulative, name = match.groups()
+            row = rows[name if options['modules'] else name.split('.')[0]]
+            row[0] += int(own)
+            row[1] = max(row[1], int(cumulative))
+            row[2] += 1
+        total = sum(x[0] for x in rows.values())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded in {result["seconds"] * 1000:.0f} ms '
+            f'(imports {total / 1000:.0f} ms), {result["modules"]} modules, '
+            f'RSS {result["rss_kib"] / 1024:.1f} MiB'
+        ))
+        self.stdout.write(
+            f'{"module" if options["modules"] else "package":<48} '
+            f'{"self ms":>9} {"cumul. ms":>10} {"modules":>8}'
+        )
+        for name, (own, cumulative, count) in sorted(
+            rows.items(), key=lambda item: -item[1][0],
+        )[:options['top']]:
+            self.stdout.write(f'{name:<48} {own / 1000:>9.1f} '
+                              f'{cumulative / 1000:>10.1f} {count:>8}')
@@ -1,9 +1,55 @@
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
 
 from foodgram.constants import PAGE_SIZE_API
+from recipes.counts import get_count
+
+
+class CountedPaginator(Paginator):
+    """A paginator taking the count of objects from a function."""
+
+    def __init__(self, object_list, per_page, count_function):
+        super().__init__(object_list, per_page)
+        self.count_function = count_function
+
+    @cached_property
+    def count(self):
+        return self.count_function()
 
 
 class PageNumberSizedPagination(PageNumberPagination):
-    """An extended PageNumberPagination with `limit` (page size) parameter."""
+    """An extended PageNumberPagination with `limit` (page size) parameter.
+
+    Views may define `get_count_options()` returning arguments of
+    `recipes.counts.get_count()`: the count is then cached or estimated,
+    `count_is_approximate` of the response tells which.
+    """
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE_API
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        self.count_is_approximate = False
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, queryset, page_size):
+        return CountedPaginator(queryset, page_size,
+                                lambda: self.get_count(queryset))
+
+    def get_count(self, queryset):
+        options = getattr(self.view, 'get_count_options', None)
+        if options is None:
+            return queryset.count()
+        count, self.count_is_approximate = get_count(queryset, **options())
+        return count
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_approximate': self.count_is_approximate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -2,6 +2,8 @@ from collections import Counter
 
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers as ser
 from drf_extra_fields.fields import Base64ImageField
 
@@ -30,6 +32,8 @@ class UserSerializer(DjoserUserSerializer):
         )
 
     def get_is_subscribed(self, user):
+        if hasattr(user, 'is_subscribed'):  # Annotated in `for_read()`.
+            return user.is_subscribed
         request = self.context['request']
         return (request
                 and request.user.is_authenticated
@@ -66,9 +70,9 @@ class ReadRecipeIngredientSerializer(ser.ModelSerializer):
 class CreateRecipeIngredientSerializer(ser.ModelSerializer):
     """A create/update/delete ingredient in a recipe serializer."""
 
-    id = ser.PrimaryKeyRelatedField(
-        source='ingredient', queryset=Ingredient.objects.all(),
-    )
+    # Existence is checked for all ingredients at once by the recipe
+    # serializer, see `CreateRecipeSerializer.validate_ingredients()`.
+    id = ser.IntegerField(source='ingredient_id')
     amount = ser.IntegerField(min_value=RECIPE_INGREDIENT_MIN_AMOUNT)
 
     class Meta:
@@ -118,11 +122,15 @@ class ReadRecipeSerializer(ser.ModelSerializer):
         )
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):  # Annotated in `for_read()`.
+            return recipe.is_favorited
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and recipe.favorites.filter(user=request.user).exists())
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and recipe.shopping_carts.filter(user=request.user).exists())
@@ -154,11 +162,24 @@ class CreateRecipeSerializer(ser.ModelSerializer):
         """Ingredients must: be non-empty, exist, be unique."""
         if not ingredients:
             raise ser.ValidationError('Обязательное поле.')
-        ids = [x['ingredient'].id for x in ingredients]
+        ids = [x['ingredient_id'] for x in ingredients]
         duplicate_ids = [x for x, count in Counter(ids).items() if count > 1]
         if duplicate_ids:
             raise ser.ValidationError(f'Ингредиенты {duplicate_ids} '
                                       f'не уникальны.')
+        # One query for all ingredients instead of one per ingredient.
+        existing_ids = set(Ingredient.objects.filter(
+            id__in=ids,
+        ).values_list('id', flat=True))
+        if len(existing_ids) < len(ids):
+            message = ser.PrimaryKeyRelatedField.default_error_messages[
+                'does_not_exist'
+            ]
+            raise ser.ValidationError([
+                {} if x in existing_ids
+                else {'id': [message.format(pk_value=x)]}
+                for x in ids
+            ])
         return ingredients
 
     @staticmethod
@@ -167,29 +188,65 @@ class CreateRecipeSerializer(ser.ModelSerializer):
         RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
                 recipe=recipe,
-                ingredient=x['ingredient'],
+                ingredient_id=x['ingredient_id'],
                 amount=x['amount'],
             )
             for x in ingredients
         )
 
+    @staticmethod
+    def update_recipe_ingredients(recipe, ingredients):
+        """Update recipe's ingredients, touching only the changed rows.
+
+        Marks the recipe for `recipes.similarity` if ingredients are
+        added or removed, the recipe is saved by the caller.
+        """
+        current = {
+            x.ingredient_id: x for x in recipe.ingredients_amounts.all()
+        }
+        new, changed = [], []
+        for x in ingredients:
+            row = current.pop(x['ingredient_id'], None)
+            if row is None:
+                new.append(x)
+            elif row.amount != x['amount']:
+                row.amount = x['amount']
+                changed.append(row)
+        if current:  # Left are the removed ones.
+            RecipeIngredient.objects.filter(
+                id__in=[x.id for x in current.values()],
+            ).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if new:
+            CreateRecipeSerializer.set_recipe_ingredients(recipe, new)
+        if current or new:
+            recipe.ingredients_changed_at = timezone.now()
+
     # Core methods.
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients_amounts')
         recipe = super().create(validated_data)
         self.set_recipe_ingredients(recipe, ingredients_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients_amounts', None)
-        ingredients_data = self.validate_ingredients(ingredients_data)
-        instance.ingredients_amounts.all().delete()
-        self.set_recipe_ingredients(instance, ingredients_data)
+        if ingredients_data is None:  # Validated if given, but required.
+            raise ser.ValidationError('Обязательное поле.')
+        self.update_recipe_ingredients(instance, ingredients_data)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        # Refetch with all relations instead of a query per ingredient.
+        instance = Recipe.objects.for_read(
+            request and request.user,
+        ).get(pk=instance.pk)
         return ReadRecipeSerializer(
-            instance, context={'request': self.context.get('request')}).data
+            instance, context={'request': request}).data
 
 
 class ShortRecipeSerializer(ser.ModelSerializer):
@@ -1,8 +1,7 @@
-from datetime import datetime
-
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
-from django.http import FileResponse
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 
@@ -13,14 +12,21 @@ from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from recipes.models import (Ingredient, Recipe, RecipeIngredient,
-                            Favorite, ShoppingCart)
+from foodgram.constants import SHOPPING_LIST_POLL_SECONDS
+from recipes import changes, counts, shopping_lists
+from recipes.models import (Ingredient, Recipe, Favorite, ShoppingCart,
+                            Subscription)
+from recipes.ndjson import (
+    CONTENT_TYPE, RecipeImporter, aexport_recipes, export_recipes
+)
+from recipes.short_links import recipe_ids
 
+from api import fragments
 from api.filters import NameFilterSet, RecipeFilterSet
 from api.permissions import IsObjAuthorOrReadOnly
 from api.serializers import (IngredientSerializer,
@@ -45,6 +51,14 @@ class UserViewSet(DjoserUserViewSet):
     # Rename `id` to `pk` as id is a python reserved keyword.
     lookup_url_kwarg = 'pk'
 
+    def get_count_options(self):
+        """Cache counts of the lists, see `recipes.counts`."""
+        if self.action == 'subscriptions':
+            user_id = self.request.user.id
+            return {'name': 'subscriptions', 'viewer': user_id,
+                    'scopes': ('users', f'subscriptions:{user_id}')}
+        return {'name': 'users', 'scopes': ('users',), 'estimate': True}
+
     @action(
         methods=('get',),
         detail=False,
@@ -79,8 +93,7 @@ class UserViewSet(DjoserUserViewSet):
             data = {'avatar': serializer.data['avatar']}
             return Response(data, status=status.HTTP_200_OK)
 
-        request.user.avatar.delete()
-        request.user.avatar = None
+        request.user.avatar = None  # The file is released on save.
         request.user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -110,25 +123,38 @@ class UserViewSet(DjoserUserViewSet):
     def subscribe(self, request, pk):
         """(Un)subscribe to another user."""
         user = request.user
-        author = get_object_or_404(User, pk=pk)
-
         if request.method == 'POST':
+            try:
+                with transaction.atomic():
+                    created = Subscription.objects.create_unless_exists(
+                        subscriber_id=user.id, author_id=pk,
+                    )
+                    if created:
+                        changes.record(changes.SUBSCRIPTIONS, user.id,
+                                       changes.CREATE)
+            except IntegrityError:  # No such author or the user himself.
+                created = False
+            author = get_object_or_404(User, pk=pk)
             if user == author:
                 raise ValidationError('Нельзя подписаться на самого себя.')
-            obj, is_created = user.subscriptions.get_or_create(author=author)
-            if not is_created:
+            if not created:
                 raise ValidationError(f'Вы уже подписаны на {author}.')
             serializer = UserRecipesSerializer(
                 author, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        # Specification awaits the return of the HTTP400, not HTTP404,
-        # Therefore, don't use get_object_or_404().
-        obj = user.subscriptions.filter(author=author)
-        if not obj.exists():
+        with transaction.atomic():
+            deleted = Subscription.objects.delete_if_exists(
+                subscriber_id=user.id, author_id=pk,
+            )
+            if deleted:
+                changes.record(changes.SUBSCRIPTIONS, user.id, changes.DELETE)
+        if not deleted:
+            # Specification awaits the return of the HTTP400, not HTTP404,
+            # if the author exists.
+            get_object_or_404(User, pk=pk)
             raise ValidationError('Вы не подписаны.')
-        obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -153,6 +179,30 @@ class RecipeViewSet(ModelViewSet):
     filterset_class = RecipeFilterSet
 
     # Core methods.
+    def get_queryset(self):
+        """Read only keys and user flags, see `api.fragments`."""
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.for_fragments(self.request.user)
+        return super().get_queryset()
+
+    def get_count_options(self):
+        return self.count_options(self.request.query_params,
+                                  self.request.user)
+
+    @staticmethod
+    def count_options(query_params, user):
+        """Cache counts of the list by filters, see `recipes.counts`."""
+        params = counts.filter_params(RecipeFilterSet, query_params)
+        scopes = ['recipes'] + [
+            f'{scope}:{user.id}'
+            for name, scope in RecipeFilterSet.related_fields.items()
+            if name in params
+        ]
+        return {
+            'name': 'recipes', 'params': params, 'scopes': scopes,
+            'viewer': user.id if len(scopes) > 1 else None, 'estimate': True,
+        }
+
     def get_serializer_class(self):
         """Return READ or CREATE serializer."""
         return (ReadRecipeSerializer
@@ -163,6 +213,21 @@ class RecipeViewSet(ModelViewSet):
         """Create new recipe and assign author to it."""
         serializer.save(author=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        """Return a page of recipes from the fragment cache."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(fragments.render(queryset, request))
+        return self.get_paginated_response(fragments.render(page, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return the recipe from the fragment cache."""
+        data = fragments.render([self.get_object()], request)
+        if not data:  # Deleted meanwhile.
+            raise Http404
+        return Response(data[0])
+
     # Additional methods.
     @staticmethod
     def handle_user_recipe_relation(model, request, recipe_id):
@@ -177,37 +242,35 @@ class RecipeViewSet(ModelViewSet):
         :raises: 404 if recipe not found, 400 if relation already exists.
         """
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=recipe_id)
+        entity = model._meta.default_related_name
         if request.method == 'POST':
-            obj, is_created = model.objects.get_or_create(
-                user_id=user.id, recipe_id=recipe.id
-            )
-            if not is_created:
+            try:
+                with transaction.atomic():
+                    created = model.objects.create_unless_exists(
+                        user_id=user.id, recipe_id=recipe_id,
+                    )
+                    if created:
+                        changes.record(entity, user.id, changes.CREATE)
+            except IntegrityError:  # No such recipe.
+                created = False
+            recipe = get_object_or_404(Recipe, pk=recipe_id)
+            if not created:
                 raise ValidationError(f'Рецепт "{recipe}" уже в списке.')
             return Response(ShortRecipeSerializer(recipe).data,
                             status=status.HTTP_201_CREATED)
 
-        # Specification awaits the return of the HTTP400, not HTTP404,
-        # Therefore, don't use get_object_or_404().
-        obj = model.objects.filter(user=user, recipe=recipe)
-        if not obj.exists():
+        with transaction.atomic():
+            deleted = model.objects.delete_if_exists(user_id=user.id,
+                                                     recipe_id=recipe_id)
+            if deleted:
+                changes.record(entity, user.id, changes.DELETE)
+        if not deleted:
+            # Specification awaits the return of the HTTP400, not HTTP404,
+            # if the recipe exists.
+            recipe = get_object_or_404(Recipe, pk=recipe_id)
             raise ValidationError(f'Рецепт "{recipe}" не существует.')
-        obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @staticmethod
-    def format_shopping_list_text(recipes, ingredients):
-        """Return formatted string with recipes and ingredients amounts."""
-        return '\n'.join([
-            f'Список покупок от {datetime.now().strftime("%d.%m.%Y")}:',
-            '\nВы хотели приготовить:',
-            *[f'{i}. {x.name}, автор: {x.author})'
-              for i, x in enumerate(recipes, 1)],
-            '\nКупить:',
-            *[f'{i}. {x["name"]} — {x["amount"]} {x["unit"]}'
-              for i, x in enumerate(ingredients, 1)],
-        ]) if ingredients else 'Список покупок пуст.'
-
     # Actions.
     @action(
         methods=('post', 'delete'),
@@ -232,32 +295,82 @@ class RecipeViewSet(ModelViewSet):
         return self.handle_user_recipe_relation(ShoppingCart, request, pk)
 
     @action(
-        methods=('get',),
+        methods=('get', 'post'),
         detail=False,
         url_path='download_shopping_cart',
         url_name='download_shopping_cart',
         permission_classes=(IsAuthenticated,),
     )
     def download_shopping_cart(self, request):
-        """Return a file with a list of ingredients and their amounts."""
-        recipes = Recipe.objects.filter(
-            shopping_carts__user=request.user
-        ).distinct()
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__in=request.user.shopping_carts.values('recipe'))
-            .values(name=F('ingredient__name'),
-                    unit=F('ingredient__measurement_unit'))
-            .annotate(amount=Sum('amount'))
-            .order_by('name')
-        )
+        """Return a file with a list of ingredients and their amounts.
+
+        POST starts a job rendering the file in the background instead,
+        see `recipes.shopping_lists`.
+        """
+        if request.method == 'POST':
+            pk, job_status = shopping_lists.start(
+                settings.SHOPPING_LIST_DIR, request.user.pk,
+            )
+            return self.shopping_list_job_response(
+                request, pk, job_status, status.HTTP_202_ACCEPTED,
+            )
         return FileResponse(
-            self.format_shopping_list_text(recipes, ingredients),
+            shopping_lists.format_text(
+                *shopping_lists.get_contents(request.user.pk)
+            ),
             filename='shopping_list.txt',
             as_attachment=True,
             content_type='text/plain'
         )
 
+    @staticmethod
+    def shopping_list_job_response(request, pk, job_status,
+                                   status_code=status.HTTP_200_OK):
+        response = Response({
+            'id': pk,
+            'status': job_status,
+            'file': request.build_absolute_uri(reverse(
+                'recipes-shopping-list-file', args=(pk,),
+            )) if job_status == shopping_lists.DONE else None,
+        }, status=status_code)
+        if job_status == shopping_lists.PENDING:
+            response['Retry-After'] = SHOPPING_LIST_POLL_SECONDS
+        return response
+
+    @action(
+        methods=('get',),
+        detail=False,
+        url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{64})',
+        url_name='shopping-list-job',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_list_job(self, request, job_id):
+        """Return the status of a shopping list job of the user."""
+        job_status = shopping_lists.get_status(settings.SHOPPING_LIST_DIR,
+                                               request.user.pk, job_id)
+        if job_status is None:
+            raise Http404('No job matches the given query.')
+        return self.shopping_list_job_response(request, job_id, job_status)
+
+    @action(
+        methods=('get',),
+        detail=False,
+        url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{64})/file',
+        url_name='shopping-list-file',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_list_file(self, request, job_id):
+        """Return the file rendered by a shopping list job of the user."""
+        path = shopping_lists.job_path(settings.SHOPPING_LIST_DIR,
+                                       request.user.pk, job_id,
+                                       shopping_lists.DONE)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            raise Http404('No file matches the given query.')
+        return FileResponse(file, filename='shopping_list.txt',
+                            as_attachment=True, content_type='text/plain')
+
     @action(
         methods=('get',),
         detail=True,
@@ -265,10 +378,69 @@ class RecipeViewSet(ModelViewSet):
         url_name='get-link',
     )
     def get_link(self, request, pk):
-        """Return a 'short'-link to the recipe."""
-        get_object_or_404(Recipe, pk=pk)
+        """Return a short link to the recipe, without querying the DB."""
+        if not pk.isdigit() or int(pk) not in recipe_ids:
+            raise Http404('No Recipe matches the given query.')
         return Response({
             'short-link': request.build_absolute_uri(
                 reverse('recipes:get_recipe', args=(pk,))
             )
         })
+
+    @action(
+        methods=('get',),
+        detail=False,
+        url_path='export',
+        url_name='export',
+        permission_classes=(IsAdminUser,),
+    )
+    def export(self, request):
+        """Stream all recipes as NDJSON, see `recipes.ndjson`.
+
+        Under ASGI the lines are produced by an async generator, Django
+        would read a sync one to the end before sending anything.
+        """
+        response = StreamingHttpResponse(
+            aexport_recipes() if settings.ASYNC_READ_VIEWS
+            else export_recipes(),
+            content_type=CONTENT_TYPE,
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        return response
+
+    @action(
+        methods=('post',),
+        detail=False,
+        url_path='import',
+        url_name='import',
+        permission_classes=(IsAdminUser,),
+    )
+    def import_recipes(self, request):
+        """Import NDJSON recipes from the body, read line by line.
+
+        :return: 201 + (created, failed, errors of the first failed lines),
+            400 + the same if no recipe was created.
+        """
+        lines = request.stream or ()  # No stream if the body is empty.
+        result = RecipeImporter(request.user).feed(lines)
+        return Response(result, status=(
+            status.HTTP_201_CREATED if result['created']
+            else status.HTTP_400_BAD_REQUEST
+        ))
+
+    @action(
+        methods=('get',),
+        detail=True,
+        url_path='similar',
+        url_name='similar',
+    )
+    def similar(self, request, pk):
+        """Return the most similar recipes, see `recipes.similarity`."""
+        if not pk.isdigit() or int(pk) not in recipe_ids:
+            raise Http404('No Recipe matches the given query.')
+        recipes = Recipe.objects.filter(
+            similar_to__recipe_id=pk,
+        ).order_by('-similar_to__score')
+        return Response(ShortRecipeSerializer(recipes, many=True).data)
@@ -0,0 +1,113 @@
+"""Brotli and gzip compression of API responses.
+
+`CompressionMiddleware` compresses responses under `COMPRESSION_PATHS` of
+compressible types and at least `COMPRESSION_MIN_BYTES`, with the
+encoding the client prefers in `Accept-Encoding` (brotli on a tie). Only
+the API is compressed: admin pages show CSRF tokens next to user input,
+which compression would expose (BREACH).
+
+Streaming responses (NDJSON exports, files) are compressed chunk by
+chunk, each chunk flushed, so they keep streaming.
+
+Compressed bodies are cached by encoding and hash of the body in
+`CACHES['compressed']`: identical responses, e.g. the anonymous recipe
+list, are only hashed, not compressed again. Static files (the API docs)
+are compressed ahead of time by `manage.py precompress` and served by
+nginx with `gzip_static`.
+"""
+import gzip
+import hashlib
+import zlib
+
+import brotli
+from django.core.cache import caches
+
+from foodgram.constants import (
+    COMPRESSION_BROTLI_QUALITY, COMPRESSION_CACHE_MAX_BYTES,
+    COMPRESSION_GZIP_LEVEL
+)
+
+BROTLI, GZIP = 'br', 'gzip'
+ENCODINGS = (BROTLI, GZIP)  # By preference.
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/x-ndjson', 'application/yaml',
+    'application/javascript', 'text/',
+)
+
+cache = caches['compressed']
+
+
+def negotiate(accept_encoding):
+    """Return the encoding of `ENCODINGS` the client prefers, None if it
+    accepts none of them."""
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, *params = item.split(';')
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    best = max(ENCODINGS,
+               key=lambda x: weights.get(x, weights.get('*', 0.0)))
+    return best if weights.get(best, weights.get('*', 0.0)) > 0 else None
+
+
+def compress(data, encoding):
+    if encoding == BROTLI:
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def compress_cached(data, encoding):
+    """Return the compressed data, compressing it once per content."""
+    if len(data) > COMPRESSION_CACHE_MAX_BYTES:
+        return compress(data, encoding)
+    key = f'{encoding}:{hashlib.blake2b(data, digest_size=16).hexdigest()}'
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(data, encoding)
+        cache.set(key, compressed)
+    return compressed
+
+
+class StreamCompressor:
+    """Compress a stream chunk by chunk, flushing every chunk."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == BROTLI:
+            self.compressor = brotli.Compressor(
+                quality=COMPRESSION_BROTLI_QUALITY,
+            )
+        else:
+            self.compressor = zlib.compressobj(
+                COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS,
+            )
+
+    def compress(self, chunk):
+        if self.encoding == BROTLI:
+            return self.compressor.process(chunk) + self.compressor.flush()
+        return (self.compressor.compress(chunk)
+                + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def finish(self):
+        if self.encoding == BROTLI:
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+    def iterate(self, chunks):
+        for chunk in chunks:
+            if chunk:
+                yield self.compress(chunk)
+        yield self.finish()
+
+    async def aiterate(self, chunks):
+        async for chunk in chunks:
+            if chunk:
+                yield self.compress(chunk)
+        yield self.finish()
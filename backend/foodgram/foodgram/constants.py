@@ -13,3 +13,100 @@ USER_AVATAR_UPLOAD_TO = 'users/profile_pictures'
 RECIPE_MIN_COOKING_TIME = 1
 RECIPE_IMAGE_UPLOAD_TO = 'recipes/images'
 RECIPE_INGREDIENT_MIN_AMOUNT = 1
+
+# Database connections (see settings.DATABASES).
+DB_CONN_MAX_AGE = 60    # Seconds to keep a persistent connection.
+DB_POOL_MIN_SIZE = 2    # Connections kept open by each worker's pool.
+DB_POOL_MAX_SIZE = 4    # Upper bound of connections per worker.
+DB_POOL_TIMEOUT = 10.0  # Seconds to wait for a free pooled connection.
+
+# Read replicas (see foodgram.db_routers).
+DB_REPLICA_PATHS = ('/api/', '/s/')        # Requests allowed to use replicas.
+DB_PRIMARY_STICKY_SECONDS = 10             # Read from primary after a write.
+DB_PRIMARY_STICKY_COOKIE = 'use_primary_db'
+
+# Short links (see recipes.short_links).
+SHORT_LINK_REFRESH_SECONDS = 1   # Min interval of checks for new recipes.
+SHORT_LINK_RELOAD_SECONDS = 300  # Interval of full reloads of recipe ids.
+
+# Slow query log (see foodgram.slow_queries).
+SLOW_QUERY_EXPLAIN_RATE = 0.1          # Share of slow queries to EXPLAIN.
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 2**20  # Rotate the log at 10 MiB.
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Ingredient search (see recipes.ingredient_search).
+INGREDIENT_SEARCH_LIMIT = 50             # Max ingredients found.
+INGREDIENT_SEARCH_THRESHOLD = 0.6        # Min share of query trigrams.
+INGREDIENT_SEARCH_RELOAD_SECONDS = 300   # Interval of index reloads.
+
+# NDJSON export and import of recipes (see recipes.ndjson).
+NDJSON_BATCH_SIZE = 1000  # Recipes written (or read) per query.
+NDJSON_MAX_ERRORS = 100   # Invalid lines reported in detail.
+
+# Media storage (see foodgram.storage).
+MEDIA_HASH_BYTES = 20  # Length of the content hash in file names.
+# Released files reused by an upload more recently aren't deleted: its
+# object may not be committed yet.
+MEDIA_REUSE_GRACE_SECONDS = 60
+
+# Orphaned media collector (see recipes/management/commands/gc_media.py).
+MEDIA_GC_GRACE_HOURS = 24          # Keep files modified more recently.
+MEDIA_GC_CHUNK_SIZE = 1000         # DB rows read and files deleted at once.
+MEDIA_GC_CHECKPOINT_EVERY = 10000  # Files checked between checkpoints.
+
+# Trending recipes (see recipes.trending).
+TRENDING_HALF_LIFE_HOURS = 48     # Time for an event's weight to halve.
+TRENDING_WEIGHTS = {'favorite': 1.0, 'shopping_cart': 1.5}
+TRENDING_LAG_SECONDS = 60         # Events newer are left for the next run.
+TRENDING_REBASE_HALF_LIVES = 30   # Rebase scores this far from the epoch.
+TRENDING_MIN_SCORE = 0.01         # Drop scores below after a rebase.
+TRENDING_BATCH_SIZE = 1000
+
+# Similar recipes (see recipes.similarity).
+SIMILAR_RECIPES_COUNT = 10    # Similar recipes stored per recipe.
+SIMILAR_MAX_DF_SHARE = 0.05   # Don't index ingredients of more recipes.
+SIMILAR_LAG_SECONDS = 60      # Changes newer are left for the next run.
+SIMILAR_BATCH_SIZE = 1000
+
+# Fast fixtures (see recipes.bulk_fixtures).
+FIXTURE_BATCH_SIZE = 5000     # Rows read or written at once.
+FIXTURE_READ_SIZE = 2 ** 16   # Characters of the fixture read at once.
+
+# Recipe fragment cache (see api.fragments).
+RECIPE_FRAGMENT_TIMEOUT = 24 * 60 * 60   # Seconds, old versions expire.
+RECIPE_FRAGMENT_MAX_ENTRIES = 20000      # Per worker with the local cache.
+RECIPE_FRAGMENT_VERSION = 1              # Bump on changes of the format.
+
+# Shopping list jobs (see recipes.shopping_lists).
+SHOPPING_LIST_PROCESSES = 2        # Pool processes per worker.
+SHOPPING_LIST_JOB_TIMEOUT = 300    # Seconds before a pending job is lost.
+SHOPPING_LIST_KEEP_HOURS = 24      # Keep rendered files for reuse.
+SHOPPING_LIST_POLL_SECONDS = 1     # `Retry-After` of pending jobs.
+
+# Counts of paginated lists (see recipes.counts).
+COUNT_CACHE_SECONDS = 60            # Max staleness with per-worker caches.
+COUNT_CACHE_MAX_ENTRIES = 10000
+COUNT_ESTIMATE_MIN_ROWS = 100000    # Count smaller tables exactly.
+
+# Change feed (see recipes.changes).
+CHANGE_FEED_POLL_SECONDS = 1      # Max staleness of caches of other workers.
+CHANGE_FEED_SETTLE_SECONDS = 10   # Max transaction time to miss no change.
+CHANGE_FEED_KEEP_HOURS = 24       # Delete older changes.
+CHANGE_FEED_PRUNE_SECONDS = 3600  # Interval of deletes by each worker.
+CHANGE_FEED_BATCH_SIZE = 1000     # Changes read at once.
+
+# Request profiler (see foodgram.profiling).
+PROFILE_HEADER = 'X-Profile'      # Asks for a profile, links to it.
+PROFILE_QUERY_PARAM = '_profile'  # Same as the header.
+PROFILE_SAMPLE_INTERVAL = 0.001   # Seconds, at least the GIL switch one.
+PROFILE_KEEP = 100                # Newest profiles kept.
+
+# Response compression (see foodgram.compression).
+COMPRESSION_PATHS = ('/api/',)          # Responses compressed.
+COMPRESSION_MIN_BYTES = 1024            # Smaller bodies are sent as is.
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5          # Of 11, fast enough per request.
+COMPRESSION_CACHE_SECONDS = 600         # Keep compressed bodies.
+COMPRESSION_CACHE_MAX_ENTRIES = 1000    # Per worker.
+# Larger bodies aren't cached, so the cache holds under 64 MiB.
+COMPRESSION_CACHE_MAX_BYTES = 2 ** 16
@@ -0,0 +1,28 @@
+"""Primary/replica database routing.
+
+Writes always go to `default` (primary). Reads go to the alias chosen for
+the current request by `foodgram.middleware.ReplicaRoutingMiddleware`,
+anything outside a request (shell, management commands) reads from primary.
+"""
+from contextvars import ContextVar
+
+# The alias to read from in the current request or task.
+read_db_alias = ContextVar('read_db_alias', default='default')
+
+
+class PrimaryReplicaRouter:
+    """Read from the per-request alias, write to primary."""
+
+    def db_for_read(self, model, **hints):
+        return read_db_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are migrated by replication.
+        return db == 'default'
@@ -0,0 +1,88 @@
+"""Prometheus metrics of requests, collected by `MetricsMiddleware`.
+
+With several gunicorn workers set `PROMETHEUS_MULTIPROC_DIR` to an empty
+directory shared by them: every worker writes its samples there and the
+`/metrics` view sums them up, whichever worker serves it.
+"""
+import os
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess
+)
+
+LABELS = ('view', 'method')
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_latency_seconds', 'Request latency.', LABELS,
+)
+RESPONSES = Counter(
+    'foodgram_responses', 'Responses by status code.', LABELS + ('status',),
+)
+REQUEST_DB_QUERIES = Histogram(
+    'foodgram_request_db_queries', 'DB queries per request.', LABELS,
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200, float('inf')),
+)
+REQUEST_DB_TIME = Histogram(
+    'foodgram_request_db_seconds', 'DB time per request.', LABELS,
+)
+# `body`: `payload` as rendered, `sent` after compression.
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_bytes', 'Response body size.', LABELS + ('body',),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, float('inf')),
+)
+
+# [queries, seconds] of the current request.
+db_stats = ContextVar('db_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """DB execute wrapper counting queries and their time."""
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = db_stats.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += perf_counter() - start
+
+
+def track_queries():
+    """Return a context manager wrapping all DB connections."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(record_query))
+    return stack
+
+
+def observe(request, response, latency, stats):
+    match = request.resolver_match
+    labels = (match.view_name if match else '<unresolved>', request.method)
+    REQUEST_LATENCY.labels(*labels).observe(latency)
+    RESPONSES.labels(*labels, response.status_code).inc()
+    REQUEST_DB_QUERIES.labels(*labels).observe(stats[0])
+    REQUEST_DB_TIME.labels(*labels).observe(stats[1])
+    size = (response.get('Content-Length') if response.streaming
+            else len(response.content))
+    if size is not None:
+        RESPONSE_SIZE.labels(*labels, 'sent').observe(int(size))
+    # Set by `CompressionMiddleware` for compressed responses.
+    size = getattr(response, 'uncompressed_size', size)
+    if size is not None:
+        RESPONSE_SIZE.labels(*labels, 'payload').observe(int(size))
+
+
+def metrics_view(request):
+    """Expose metrics of all workers in the Prometheus text format."""
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
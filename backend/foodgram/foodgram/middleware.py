@@ -0,0 +1,281 @@
+import random
+from time import perf_counter, time
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from foodgram.constants import (
+    DB_REPLICA_PATHS, DB_PRIMARY_STICKY_SECONDS, DB_PRIMARY_STICKY_COOKIE,
+    PROFILE_HEADER, COMPRESSION_PATHS, COMPRESSION_MIN_BYTES
+)
+from foodgram.db_routers import read_db_alias
+from foodgram import compression, metrics, profiling, slow_queries
+from recipes.changes import change_feed
+
+
+class BaseMiddleware:
+    """A middleware working in the mode of the handler it wraps.
+
+    Under ASGI a sync-only middleware makes Django adapt the whole stack
+    below it to sync, and async views would run through `async_to_sync`
+    in a thread. Subclasses serve async requests with `__acall__`.
+
+    DB connections are per thread: in async mode execute wrappers are
+    entered and exited with `sync_to_async`, in the thread which runs the
+    sync code and async ORM queries of the request.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Record latency, status, DB usage and size of every response.
+
+    Metrics are labeled with the resolved view name, e.g. `recipes-list`.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = [0, 0.0]
+        token = metrics.db_stats.set(stats)
+        start = perf_counter()
+        try:
+            with metrics.track_queries():
+                response = self.get_response(request)
+        finally:
+            metrics.db_stats.reset(token)
+        metrics.observe(request, response, perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = [0, 0.0]
+        token = metrics.db_stats.set(stats)
+        start = perf_counter()
+        queries = await sync_to_async(metrics.track_queries)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries.close)()
+            metrics.db_stats.reset(token)
+        metrics.observe(request, response, perf_counter() - start, stats)
+        return response
+
+
+class ReplicaRoutingMiddleware(BaseMiddleware):
+    """Choose the database to read from for the whole request.
+
+    Safe requests to the API read from one random replica. Unsafe ones use
+    primary and set a short-lived cookie that keeps the client on primary,
+    so it doesn't miss its own changes while replicas catch up.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not settings.DB_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @staticmethod
+    def is_sticky(request):
+        """Whether the client wrote something in the last few seconds."""
+        try:
+            until = float(request.COOKIES.get(DB_PRIMARY_STICKY_COOKIE, 0))
+        except ValueError:
+            return False
+        return until > time()
+
+    def choose_db(self, request):
+        """Set the database to read from, return the token to reset it."""
+        use_replica = (request.method in self.SAFE_METHODS
+                       and request.path.startswith(DB_REPLICA_PATHS)
+                       and not self.is_sticky(request))
+        return read_db_alias.set(
+            random.choice(settings.DB_REPLICAS) if use_replica else 'default'
+        )
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = self.choose_db(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_db_alias.reset(token)
+        return self.stick(request, response)
+
+    async def __acall__(self, request):
+        token = self.choose_db(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_db_alias.reset(token)
+        return self.stick(request, response)
+
+    def stick(self, request, response):
+        """Keep the client on primary for a while after a write."""
+        if request.method not in self.SAFE_METHODS:
+            response.set_cookie(
+                DB_PRIMARY_STICKY_COOKIE,
+                str(time() + DB_PRIMARY_STICKY_SECONDS),
+                max_age=DB_PRIMARY_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class SlowQueryMiddleware(BaseMiddleware):
+    """Attribute slow queries to the request's view and user."""
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        slow_queries.create_log_dir()
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = slow_queries.current_request.set(request)
+        try:
+            with slow_queries.log_queries():
+                return self.get_response(request)
+        finally:
+            slow_queries.current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = slow_queries.current_request.set(request)
+        queries = await sync_to_async(slow_queries.log_queries)()
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(queries.close)()
+            slow_queries.current_request.reset(token)
+
+
+class ProfilingMiddleware:
+    """Profile requests of staff asking for it (see `profiling`).
+
+    Sync only: profilers follow the thread serving the request, so with
+    `DJANGO_PROFILING=True` Django serves ASGI requests in sync mode.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = profiling.get_mode(request)
+        if mode is None or not profiling.is_staff(request):
+            return self.get_response(request)
+        if not profiling.lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response[PROFILE_HEADER] = 'busy'
+            return response
+        try:
+            response, link = profiling.profile(request, self.get_response,
+                                               mode)
+        finally:
+            profiling.lock.release()
+        response[PROFILE_HEADER] = link
+        return response
+
+
+class ChangeFeedMiddleware(BaseMiddleware):
+    """Apply changes made by other workers to this one's caches before
+    serving a request (see `recipes.changes`)."""
+
+    def __init__(self, get_response):
+        if not settings.CHANGE_FEED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        change_feed.poll()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Most requests come within the poll interval and stay in the
+        # event loop, only reading the feed takes a thread.
+        if not change_feed.is_fresh():
+            await sync_to_async(change_feed.poll)()
+        return await self.get_response(request)
+
+
+class CompressionMiddleware(BaseMiddleware):
+    """Compress API responses with brotli or gzip (see `compression`)."""
+
+    def __init__(self, get_response):
+        if not settings.COMPRESSION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @staticmethod
+    def is_compressible(request, response):
+        return (
+            request.path.startswith(COMPRESSION_PATHS)
+            and not response.has_header('Content-Encoding')
+            and response.get('Content-Type', '').startswith(
+                compression.COMPRESSIBLE_TYPES
+            )
+            and (response.streaming
+                 or len(response.content) >= COMPRESSION_MIN_BYTES)
+        )
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if not self.is_compressible(request, response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(
+            request.headers.get('Accept-Encoding', '')
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            compressor = compression.StreamCompressor(encoding)
+            response.streaming_content = (
+                compressor.aiterate(response.streaming_content)
+                if response.is_async
+                else compressor.iterate(response.streaming_content)
+            )
+            del response['Content-Length']
+        else:
+            response.uncompressed_size = len(response.content)
+            response.content = compression.compress_cached(response.content,
+                                                           encoding)
+            response['Content-Length'] = str(len(response.content))
+        # The compressed body differs, but means the same.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,203 @@
+"""On-demand profiles of single requests, for staff.
+
+Enabled by `DJANGO_PROFILING=True`, otherwise `ProfilingMiddleware` isn't
+even installed. A staff user (session or API token) asks for a profile
+with the `X-Profile` header or the `_profile` query parameter:
+
+- `sample` (or `1`): a thread samples the stack of the request every
+  `PROFILE_SAMPLE_INTERVAL` seconds and counts folded stacks,
+  `<id>.folded`, read by flamegraph.pl, speedscope and the like;
+- `cprofile`: the request runs under cProfile, `<id>.prof` is a pstats
+  file (snakeviz, flameprof, `python -m pstats`).
+
+Either way the SQL of the request is collected with durations (without
+parameters) into `<id>.json` along with the request, its duration and the
+link to the profile file. The response links to it in `X-Profile`;
+profiles are served to staff only by `profile_view`. The newest
+`PROFILE_KEEP` profiles are kept in `PROFILE_DIR`.
+
+One request per worker is profiled at a time (profilers are process-wide
+on Python 3.12+), others get `X-Profile: busy`. Under ASGI async views run
+in the event loop thread and show in profiles as waiting.
+"""
+import cProfile
+import json
+import secrets
+import sys
+import threading
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse, Http404
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+
+from foodgram.constants import (
+    PROFILE_HEADER, PROFILE_KEEP, PROFILE_QUERY_PARAM, PROFILE_SAMPLE_INTERVAL
+)
+
+SAMPLE, CPROFILE = 'sample', 'cprofile'
+MODES = {'1': SAMPLE, SAMPLE: SAMPLE, CPROFILE: CPROFILE}
+SUFFIXES = {SAMPLE: '.folded', CPROFILE: '.prof'}
+CONTENT_TYPES = {
+    '.json': 'application/json',
+    '.folded': 'text/plain',
+    '.prof': 'application/octet-stream',
+}
+
+# Held while a request of the worker is profiled.
+lock = threading.Lock()
+
+
+class Sampler(threading.Thread):
+    """Count the folded stacks of a thread, sampled at an interval."""
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} '
+                             f'({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def save(self, path):
+        Path(path).write_text(''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        ), encoding='utf-8')
+
+
+def get_mode(request):
+    """Return the profiler asked for, None if the request isn't profiled."""
+    flag = (request.headers.get(PROFILE_HEADER)
+            or request.GET.get(PROFILE_QUERY_PARAM))
+    return MODES.get(flag.lower()) if flag else None
+
+
+def is_staff(request):
+    """Whether the request is sent by staff, with a session or a token."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    authenticators = [authentication() for authentication
+                      in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        return Request(request, authenticators=authenticators).user.is_staff
+    except APIException:
+        return False
+
+
+def collect_queries(queries):
+    """Return a context manager adding queries of all DB connections."""
+    def record(execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries.append({
+                'db': context['connection'].alias,
+                'duration_ms': round((perf_counter() - start) * 1000, 3),
+                'many': many,
+                'sql': sql,
+            })
+
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(record))
+    return stack
+
+
+def delete_old(directory):
+    """Delete files of all profiles but the newest `PROFILE_KEEP`."""
+    ids = sorted({path.stem for path in directory.iterdir()
+                  if path.suffix in CONTENT_TYPES})
+    for pk in ids[:-PROFILE_KEEP]:
+        for path in directory.glob(f'{pk}.*'):
+            path.unlink(missing_ok=True)
+
+
+def profile(request, get_response, mode):
+    """Serve the request under the profiler, save the profile.
+
+    The report is saved even if the response raises, with the error.
+
+    :return: the response and the link to the saved report.
+    """
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    pk = f'{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(4)}'
+    queries = []
+    response = error = None
+    if mode == SAMPLE:
+        profiler = Sampler(threading.get_ident())
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = perf_counter()
+    try:
+        with collect_queries(queries):
+            response = get_response(request)
+    except Exception as exc:
+        error = repr(exc)
+        raise
+    finally:
+        duration = perf_counter() - start
+        if mode == SAMPLE:
+            profiler.stop()
+            profiler.save(directory / f'{pk}{SUFFIXES[mode]}')
+        else:
+            profiler.disable()
+            profiler.dump_stats(directory / f'{pk}{SUFFIXES[mode]}')
+        (directory / f'{pk}.json').write_text(json.dumps({
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response and response.status_code,
+            'error': error,
+            'duration_ms': round(duration * 1000, 2),
+            'mode': mode,
+            'profile': reverse('profile', args=(f'{pk}{SUFFIXES[mode]}',),
+                               request=request),
+            'queries_count': len(queries),
+            'queries_ms': round(sum(x['duration_ms'] for x in queries), 3),
+            'queries': queries,
+        }, ensure_ascii=False, indent=2), encoding='utf-8')
+        delete_old(directory)
+    return response, reverse('profile', args=(f'{pk}.json',),
+                             request=request)
+
+
+@api_view(('GET',))
+@permission_classes((IsAdminUser,))
+def profile_view(request, name):
+    """Serve a file of a saved profile."""
+    path = Path(settings.PROFILE_DIR) / name
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        raise Http404('No profile matches the given query.')
+    return FileResponse(file, content_type=CONTENT_TYPES[path.suffix])
@@ -3,7 +3,12 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from foodgram.constants import (
-    PAGE_SIZE_PRJCT, DRF_THROTTLE_RATES_USER, DRF_THROTTLE_RATES_ANON
+    PAGE_SIZE_PRJCT, DRF_THROTTLE_RATES_USER, DRF_THROTTLE_RATES_ANON,
+    DB_CONN_MAX_AGE, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT,
+    SLOW_QUERY_EXPLAIN_RATE, SLOW_QUERY_LOG_MAX_BYTES, SLOW_QUERY_LOG_BACKUPS,
+    RECIPE_FRAGMENT_TIMEOUT, RECIPE_FRAGMENT_MAX_ENTRIES,
+    RECIPE_FRAGMENT_VERSION, COUNT_CACHE_SECONDS, COUNT_CACHE_MAX_ENTRIES,
+    COMPRESSION_CACHE_SECONDS, COMPRESSION_CACHE_MAX_ENTRIES
 )
 
 # Set the project root directory.
@@ -33,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third-party.
     'rest_framework',            # API Framework.
@@ -47,7 +53,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.MetricsMiddleware',  # Prometheus metrics.
+    'foodgram.middleware.CompressionMiddleware',  # API responses.
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.middleware.ReplicaRoutingMiddleware',  # Read replicas.
+    'foodgram.middleware.ChangeFeedMiddleware',  # Cache invalidation.
+    'foodgram.middleware.SlowQueryMiddleware',  # Slow query log.
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS.
     'django.middleware.common.CommonMiddleware',
@@ -55,8 +66,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.middleware.ProfilingMiddleware',  # Profiles for staff.
 ]
 
+# Collect request metrics and serve them on `/metrics` (see `metrics`).
+METRICS_ENABLED = os.getenv('DJANGO_METRICS', 'True') == 'True'
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -76,10 +91,28 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
+# Serve the hottest read endpoints with async views (see `api.async_views`).
+# Enable only together with an ASGI server, under WSGI they're slower.
+ASYNC_READ_VIEWS = os.getenv('DJANGO_ASGI', 'False') == 'True'
 
 
 # Database definition.
 # Set up PSQL if running in Docker else use SQLite.
+# PSQL connections are either persistent (`DB_CONN_MAX_AGE` seconds, checked
+# before reuse) or taken from a psycopg 3 pool (`DB_POOL=True`). Django
+# doesn't allow both at once, so the pool disables persistent connections.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+DB_POOL_OPTIONS = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', DB_POOL_MIN_SIZE)),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', DB_POOL_MAX_SIZE)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', DB_POOL_TIMEOUT)),
+}
+if DB_POOL:
+    from psycopg_pool import ConnectionPool
+    # Ping a connection before handing it out of the pool.
+    DB_POOL_OPTIONS['check'] = ConnectionPool.check_connection
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -87,7 +120,15 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
-        'PORT': os.getenv('DB_PORT', '5432')
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': (
+            0 if DB_POOL
+            else int(os.getenv('DB_CONN_MAX_AGE', DB_CONN_MAX_AGE))
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+        ),
+        'OPTIONS': {'pool': DB_POOL_OPTIONS} if DB_POOL else {},
     }
 } if os.getenv('IS_DOCKER') else {
     'default': {
@@ -96,6 +137,101 @@ DATABASES = {
     }
 }
 
+# Read replicas, separated by whitespace: `host[:port]` for PSQL or a file
+# name for SQLite. Safe API requests read from them, see `db_routers`.
+for number, replica in enumerate(os.getenv('DB_REPLICAS', '').split(), 1):
+    if os.getenv('IS_DOCKER'):
+        host, _, port = replica.partition(':')
+        location = {'HOST': host, 'PORT': port or os.getenv('DB_PORT')}
+    else:
+        location = {'NAME': BASE_DIR / replica}
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        **location,
+        'TEST': {'MIRROR': 'default'},
+    }
+DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = (
+    ['foodgram.db_routers.PrimaryReplicaRouter'] if DB_REPLICAS else []
+)
+
+# Slow query log (see `foodgram.slow_queries`), off if the threshold is 0.
+SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 0))
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.getenv('DB_SLOW_QUERY_EXPLAIN_RATE', SLOW_QUERY_EXPLAIN_RATE)
+)
+SLOW_QUERY_LOG = os.getenv('DB_SLOW_QUERY_LOG',
+                           BASE_DIR / 'logs/slow_queries.log')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': SLOW_QUERY_LOG_MAX_BYTES,
+            'backupCount': SLOW_QUERY_LOG_BACKUPS,
+            'encoding': 'utf-8',
+            # Opened on first use, the directory is created by the middleware.
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'foodgram.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+# Caches. Viewer-independent parts of recipes are cached separately, see
+# `api.fragments`; RECIPE_FRAGMENTS=False turns that off.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipe_fragments': {
+        'BACKEND': (
+            'django.core.cache.backends.locmem.LocMemCache'
+            if os.getenv('RECIPE_FRAGMENTS', 'True') == 'True'
+            else 'django.core.cache.backends.dummy.DummyCache'
+        ),
+        'LOCATION': 'recipe_fragments',
+        'TIMEOUT': RECIPE_FRAGMENT_TIMEOUT,
+        'VERSION': RECIPE_FRAGMENT_VERSION,
+        'OPTIONS': {'MAX_ENTRIES': RECIPE_FRAGMENT_MAX_ENTRIES},
+    },
+    # Counts of paginated lists, see `recipes.counts`.
+    'counts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'counts',
+        'TIMEOUT': COUNT_CACHE_SECONDS,
+        'OPTIONS': {'MAX_ENTRIES': COUNT_CACHE_MAX_ENTRIES},
+    },
+    # Compressed response bodies, see `foodgram.compression`.
+    'compressed': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'compressed',
+        'TIMEOUT': COMPRESSION_CACHE_SECONDS,
+        'OPTIONS': {'MAX_ENTRIES': COMPRESSION_CACHE_MAX_ENTRIES},
+    },
+}
+# Take counts of unfiltered lists from PostgreSQL statistics, approximate.
+COUNT_ESTIMATE = os.getenv('DB_COUNT_ESTIMATE', 'False') == 'True'
+
+# Changes of cached data polled by all workers, see `recipes.changes`.
+# Off only with a single worker process.
+CHANGE_FEED = os.getenv('CHANGE_FEED', 'True') == 'True'
+
+# Brotli/gzip compression of API responses, see `foodgram.compression`.
+COMPRESSION = os.getenv('DJANGO_COMPRESSION', 'True') == 'True'
+
 
 # Authentication.
 AUTH_USER_MODEL = 'recipes.User'
@@ -127,6 +263,20 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
+# Shopping lists rendered by jobs, see `recipes.shopping_lists`. Must be
+# shared by all workers, but not served publicly.
+SHOPPING_LIST_DIR = os.getenv('SHOPPING_LIST_DIR',
+                              BASE_DIR / 'shopping_lists')
+# Request profiles of staff, see `foodgram.profiling`. Off by default.
+PROFILING = os.getenv('DJANGO_PROFILING', 'False') == 'True'
+PROFILE_DIR = os.getenv('PROFILE_DIR', BASE_DIR / 'profiles')
+STORAGES = {
+    # Deduplicated files named by content hash, see `foodgram.storage`.
+    'default': {'BACKEND': 'foodgram.storage.ContentAddressedStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 
 
 # Default primary key field type.
@@ -146,8 +296,8 @@ REST_FRAMEWORK = {
         'rest_framework.throttling.AnonRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'user': DRF_THROTTLE_RATES_USER,
-        'anon': DRF_THROTTLE_RATES_ANON,
+        'user': os.getenv('DRF_THROTTLE_RATE_USER', DRF_THROTTLE_RATES_USER),
+        'anon': os.getenv('DRF_THROTTLE_RATE_ANON', DRF_THROTTLE_RATES_ANON),
     },
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageNumberSizedPagination',
     'PAGE_SIZE': PAGE_SIZE_PRJCT,
@@ -0,0 +1,146 @@
+"""Slow query log with sampled query plans.
+
+Enabled by `DB_SLOW_QUERY_MS`: every query of a request (see
+`SlowQueryMiddleware`) running longer is written as a JSON line to the
+rotating `SLOW_QUERY_LOG` with its duration, view name, user id and a
+fingerprint of the normalized SQL. A `SLOW_QUERY_EXPLAIN_RATE` share of
+slow SELECTs also gets a query plan: `EXPLAIN ANALYZE` on PostgreSQL (it
+runs the query again, hence SELECTs only), `EXPLAIN QUERY PLAN` on
+SQLite. The plan is taken in a savepoint, so a failing EXPLAIN doesn't
+break the transaction of the request. Summarize the log with
+`manage.py slow_queries`.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+from contextlib import ExitStack
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger('foodgram.slow_queries')
+
+# The request being served, set by `SlowQueryMiddleware`.
+current_request = ContextVar('slow_query_request', default=None)
+# Set while running EXPLAIN, so it isn't logged itself.
+explaining = ContextVar('slow_query_explaining', default=False)
+
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),              # Strings.
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),           # Numbers.
+    (re.compile(r'%s'), '?'),                          # Parameters.
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),  # IN lists.
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalize(sql):
+    """Replace literals and parameters so that similar queries match."""
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.md5(normalized_sql.encode()).hexdigest()[:12]
+
+
+def request_info():
+    """Return the view name and user id of the current request."""
+    request = current_request.get()
+    if request is None:
+        return None, None
+    match = request.resolver_match
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        # Session user isn't loaded, don't query the DB from here.
+        user = None
+    return (match.view_name if match else None,
+            getattr(user, 'id', None))
+
+
+def explain(connection, sql, params):
+    """Return the query plan as text, `None` if it can't be explained."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        prefix = connection.ops.explain_query_prefix(analyze=True)
+    elif vendor == 'sqlite':
+        prefix = connection.ops.explain_query_prefix()
+    else:
+        return None
+    token = explaining.set(True)
+    try:
+        with transaction.atomic(using=connection.alias, savepoint=True):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}', params)
+                rows = cursor.fetchall()
+    except Exception as error:
+        return f'EXPLAIN failed: {error}'
+    finally:
+        explaining.reset(token)
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+def log_slow_query(execute, sql, params, many, context):
+    """DB execute wrapper writing slow queries to the log."""
+    start = perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (perf_counter() - start) * 1000
+    if duration < settings.SLOW_QUERY_MS or explaining.get():
+        return result
+
+    normalized = normalize(sql)
+    view, user_id = request_info()
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'duration_ms': round(duration, 2),
+        'view': view,
+        'user_id': user_id,
+        'db': context['connection'].alias,
+        'fingerprint': fingerprint(normalized),
+        'sql': normalized,
+    }
+    if not many and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE:
+        entry['plan'] = explain(context['connection'], sql, params)
+    logger.warning(json.dumps(entry, ensure_ascii=False))
+    return result
+
+
+def create_log_dir():
+    Path(settings.SLOW_QUERY_LOG).parent.mkdir(parents=True, exist_ok=True)
+
+
+def log_queries():
+    """Return a context manager wrapping all DB connections."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(log_slow_query))
+    return stack
+
+
+def read_log(path):
+    """Yield entries of the log and its rotated backups, oldest first."""
+    path = Path(path)
+    backups = sorted(
+        (file for file in path.parent.glob(f'{path.name}.*')
+         if file.suffix[1:].isdigit()),
+        key=lambda file: int(file.suffix[1:]), reverse=True,
+    )
+    for file in [*backups, path]:
+        if not file.exists():
+            continue
+        with open(file, encoding='utf-8') as lines:
+            for line in lines:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
@@ -0,0 +1,17 @@
+"""Warm-up of a freshly started worker.
+
+Django imports the URLconf, and with it DRF and all the views, only on the
+first request, which a fresh worker then answers several times slower.
+`warm_up` does it while the application loads instead. With gunicorn's
+`preload_app` (see `gunicorn.conf.py`) that happens once in the master, and
+forked workers share the imported code copy-on-write.
+
+The warm-up must not touch the database: a connection opened in the master
+would be shared by all the forked workers.
+"""
+from django.urls import get_resolver
+
+
+def warm_up():
+    """Import the URLconf with all the views, build reverse lookups."""
+    get_resolver().reverse_dict
@@ -0,0 +1,82 @@
+"""Media storage naming files by the hash of their content.
+
+An upload to `recipes/images/x.png` is stored as
+`recipes/images/ab/cd/abcd....png`, the name being the BLAKE2b hash of
+the content sharded by its first bytes. Uploading the same content again
+reuses the file. Since a name never changes its content, nginx serves
+such files with immutable far-future cache headers.
+
+A file may be shared by several objects, so `delete()` removes it only
+when no file field refers to it any more, an index lookup per field (the
+file columns are indexed). Models release the files they stop using after
+commit (see `recipes.signals`). The file fields are the source of truth:
+names also get there without an upload (NDJSON import, fixtures, bulk
+writes), so uses aren't counted in a table of their own, and files missed
+by the releases, e.g. after `QuerySet.update()`, are collected by
+`gc_media`.
+"""
+import hashlib
+import os
+import time
+from pathlib import PurePosixPath
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+from foodgram.constants import MEDIA_HASH_BYTES, MEDIA_REUSE_GRACE_SECONDS
+
+CHUNK_SIZE = 64 * 2**10
+
+
+def is_referenced(name):
+    """Whether a file field of any model refers to the file.
+
+    File fields must be indexed, or every release scans their table.
+    """
+    return any(
+        model._default_manager.filter(**{field.name: name}).exists()
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField)
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage deduplicating files, see the module docstring."""
+
+    @staticmethod
+    def hashed_name(name, content):
+        digest = hashlib.blake2b(digest_size=MEDIA_HASH_BYTES)
+        content.seek(0)
+        for chunk in content.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        path = PurePosixPath(name)
+        return str(path.parent / digest[:2] / digest[2:4]
+                   / f'{digest}{path.suffix.lower()}')
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if not self.exists(name):
+            saved = super()._save(name, content)
+            if saved != name:
+                # Written by a concurrent upload of the same content.
+                super().delete(saved)
+        else:
+            # Fresh again: `delete()` and `gc_media` spare it while the
+            # new use isn't committed yet.
+            os.utime(self.path(name))
+        return name
+
+    def delete(self, name):
+        if not name or is_referenced(name):
+            return
+        try:
+            if (time.time() - os.stat(self.path(name)).st_mtime
+                    < MEDIA_REUSE_GRACE_SECONDS):
+                return
+        except FileNotFoundError:
+            return
+        super().delete(name)
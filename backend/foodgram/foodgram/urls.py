@@ -1,7 +1,10 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from foodgram.metrics import metrics_view
+from foodgram.profiling import profile_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -9,6 +12,16 @@ urlpatterns = [
     path('', include('recipes.urls')),  # Short-link.
 ]
 
+if settings.METRICS_ENABLED:
+    # Not proxied by nginx, scraped from the internal network only.
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
+
+if settings.PROFILING:
+    urlpatterns.append(re_path(
+        r'^api/profiles/(?P<name>[\w-]+\.(?:json|folded|prof))$',
+        profile_view, name='profile',
+    ))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)
@@ -1,6 +1,7 @@
 from django.db.models import Count
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
 from .models import (
@@ -191,6 +192,18 @@ class RecipeAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     ordering = ('-created_at',)
 
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        if formset.model is RecipeIngredient and (
+            formset.new_objects or formset.deleted_objects
+            or any('ingredient' in fields
+                   for _, fields in formset.changed_objects)
+        ):
+            # Recompute its similar recipes, see `recipes.similarity`.
+            Recipe.objects.filter(pk=form.instance.pk).update(
+                ingredients_changed_at=timezone.now(),
+            )
+
     @admin.display(description='В избранном')
     def favorited_count(self, recipe):
         return recipe.favorites.count()
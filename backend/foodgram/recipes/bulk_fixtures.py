@@ -0,0 +1,356 @@
+"""Fast dump and restore of Django JSON fixtures for large datasets.
+
+`dumpdata` and `loaddata` build a model instance per object and
+`loaddata` saves them one by one. Here table rows are read as tuples and
+written a batch at a time: with `COPY` on PostgreSQL, with INSERTs of many
+rows elsewhere. The dump is the same, byte for byte, as the one of
+`dumpdata`; the restore takes any fixture in that format.
+
+The restore runs in one transaction. Foreign keys are checked at its end
+(as `loaddata` does), so tables may come in any order, then sequences are
+reset. Like `loaddata` it sends no signals, keeps `auto_now` values of the
+fixture and uses defaults for missing fields. Unlike it, objects must have
+a `pk` and existing rows aren't updated: restore into empty tables, or
+`flush=True` to empty them first. Flushing a table also empties the tables
+referring to it that aren't restored, e.g. similar recipes when restoring
+recipes, dependent ones first.
+"""
+import json
+import re
+
+from django.apps import apps
+from django.core import serializers
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.utils.encoding import is_protected_type
+
+from foodgram.constants import FIXTURE_BATCH_SIZE, FIXTURE_READ_SIZE
+
+WHITESPACE = re.compile(r'\s*')
+
+
+class Row:
+    """Attributes of one table row, for `Field.value_to_string`."""
+
+
+def get_models(labels, using):
+    """Return models of `app_label` or `app_label.Model` labels in the
+    order `dumpdata` uses."""
+    app_list = {}
+    for label in labels:
+        app_label, _, model_name = label.partition('.')
+        app_config = apps.get_app_config(app_label)
+        if not model_name:
+            app_list[app_config] = None
+        elif app_list.get(app_config, []) is not None:
+            app_list.setdefault(app_config, []).append(
+                app_config.get_model(model_name)
+            )
+    return [
+        model for model in serializers.sort_dependencies(
+            app_list.items(), allow_cycles=True,
+        )
+        if not model._meta.proxy
+        and router.allow_migrate_model(using, model)
+    ]
+
+
+def is_copy_supported(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    return is_psycopg3
+
+
+class FixtureWriter:
+    """Write objects as `dumpdata` does."""
+
+    def __init__(self, stream, indent=None):
+        self.stream = stream
+        self.indent = indent
+        self.first = True
+        # `json.dump` would encode in Python, piece by piece.
+        self.encoder = DjangoJSONEncoder(
+            ensure_ascii=False, indent=indent,
+            separators=(',', ': ') if indent else None,
+        )
+        stream.write('[')
+
+    def write(self, data):
+        if not self.first:
+            self.stream.write(',' if self.indent else ', ')
+        if self.indent:
+            self.stream.write('\n')
+        self.stream.write(self.encoder.encode(data))
+        self.first = False
+
+    def close(self):
+        self.stream.write('\n]\n' if self.indent else ']')
+
+
+def serialize(field, value):
+    """Return the value as `dumpdata` writes it."""
+    if is_protected_type(value):
+        return value
+    row = Row()
+    setattr(row, field.attname, value)
+    return field.value_to_string(row)
+
+
+def m2m_fields(model):
+    """Return many-to-many fields serialized as lists of primary keys."""
+    return [field for field in model._meta.local_many_to_many
+            if field.serialize
+            and field.remote_field.through._meta.auto_created]
+
+
+def read_m2m(field, pks, using):
+    """Return {pk: [related pk]} of the objects, in `dumpdata` order."""
+    through = field.remote_field.through
+    source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+    ordering = [
+        f'-{target}__{x[1:]}' if x.startswith('-') else f'{target}__{x}'
+        for x in field.related_model._meta.ordering if isinstance(x, str)
+    ]
+    result = {pk: [] for pk in pks}
+    for pk, related in through._default_manager.using(using).filter(**{
+        f'{source}__in': pks,
+    }).order_by(source, *ordering, 'pk').values_list(
+        through._meta.get_field(source).attname,
+        through._meta.get_field(target).attname,
+    ):
+        result[pk].append(related)
+    return result
+
+
+def write_batch(writer, model, batch, using):
+    """Write [(pk, fields)] of the model with their many-to-many lists."""
+    meta = model._meta
+    related = {
+        field: read_m2m(field, [pk for pk, _ in batch], using)
+        for field in m2m_fields(model)
+    }
+    for pk, data in batch:
+        for field, values in related.items():
+            data[field.name] = [serialize(field.related_model._meta.pk, x)
+                                for x in values[pk]]
+        writer.write({'model': meta.label_lower,
+                      'pk': serialize(meta.pk, pk), 'fields': data})
+
+
+def dump(models, stream, indent=None, using='default'):
+    """Write objects of the models to the stream, return their count."""
+    writer = FixtureWriter(stream, indent)
+    count = 0
+    for model in models:
+        fields = [field for field in model._meta.local_fields
+                  if field.serialize]
+        batch = []
+        for pk, *row in model._default_manager.using(using).order_by(
+            model._meta.pk.name,
+        ).values_list('pk', *(field.attname for field in fields)).iterator(
+            chunk_size=FIXTURE_BATCH_SIZE,
+        ):
+            batch.append((pk, {
+                field.name: serialize(field, value)
+                for field, value in zip(fields, row)
+            }))
+            if len(batch) >= FIXTURE_BATCH_SIZE:
+                write_batch(writer, model, batch, using)
+                count += len(batch)
+                batch = []
+        write_batch(writer, model, batch, using)
+        count += len(batch)
+    writer.close()
+    return count
+
+
+def read_fixture(stream):
+    """Yield objects of the JSON array in the text stream, read in pieces."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    expected = '['
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            if eof:
+                raise ValueError('Unexpected end of the fixture.')
+            buffer, position = stream.read(FIXTURE_READ_SIZE), 0
+            eof = not buffer
+            continue
+        char = buffer[position]
+        if expected == '[':
+            if char != '[':
+                raise ValueError('The fixture must be a JSON array.')
+            position += 1
+            expected = 'object or ]'
+        elif char == ']' and expected != 'object':
+            return
+        elif expected == ', or ]':
+            if char != ',':
+                raise ValueError(f'Expected "," or "]" at position '
+                                 f'{position} of "{buffer[:40]}...".')
+            position += 1
+            expected = 'object'
+        else:
+            try:
+                data, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The object continues in the next piece.
+                chunk = stream.read(FIXTURE_READ_SIZE)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+                continue
+            yield data
+            expected = ', or ]'
+
+
+class FixtureLoader:
+    """Restore fixtures, see the module docstring."""
+
+    def __init__(self, using='default', flush=False):
+        self.using = using
+        self.connection = connections[using]
+        self.copy = is_copy_supported(self.connection)
+        self.flush_tables = flush
+        self.flushed = set()
+        self.restored = set()  # Models and their many-to-many tables.
+        self.models = set()
+        self.tables = set()
+        self.count = 0
+        self.model = None
+        self.rows = []
+        self.m2m_rows = {}  # Field to [(pk, related pk)].
+
+    def convert(self, field):
+        """Return a function making the DB value of a fixture value."""
+        connection = self.connection
+        if field.many_to_one or field.one_to_one:
+            target = field.target_field
+            return lambda value: field.get_db_prep_save(
+                None if value is None else target.to_python(value),
+                connection,
+            )
+        return lambda value: field.get_db_prep_save(field.to_python(value),
+                                                    connection)
+
+    def start(self, model):
+        """Prepare to load objects of the model."""
+        self.flush()
+        meta = model._meta
+        self.model = model
+        self.fields = [(field, self.convert(field))
+                       for field in meta.local_concrete_fields]
+        self.pk = self.convert(meta.pk)
+        self.names = {field.name for field in meta.local_concrete_fields}
+        self.m2m = {}
+        for field in m2m_fields(model):
+            through = field.remote_field.through._meta
+            self.m2m[field.name] = (field, self.convert(
+                through.get_field(field.m2m_reverse_field_name()),
+            ))
+        if model in self.models:
+            return
+        if self.flush_tables:
+            self.delete_rows(model)
+        self.models.add(model)
+        self.restored.update([model] + [field.remote_field.through
+                                        for field, _ in self.m2m.values()])
+        self.tables.update(x._meta.db_table for x in self.restored)
+
+    def delete_rows(self, model):
+        """Empty the table of the model after the tables referring to it,
+        except restored ones: their rows refer to restored rows."""
+        self.flushed.add(model)
+        dependents = [
+            relation.through if relation.many_to_many
+            else relation.related_model
+            for relation in model._meta.related_objects
+        ] + [field.remote_field.through for field in m2m_fields(model)]
+        for dependent in dependents:
+            if dependent not in self.flushed | self.restored:
+                self.delete_rows(dependent)
+        table = self.connection.ops.quote_name(model._meta.db_table)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table}')
+
+    def add(self, data):
+        model = apps.get_model(data['model'])
+        if model is not self.model:
+            self.start(model)
+        if data.get('pk') is None:
+            raise ValueError('`pk` is required.')
+        pk = self.pk(data['pk'])
+        values = data.get('fields', {})
+        unknown = set(values) - self.names - set(self.m2m)
+        if unknown:
+            raise ValueError(f'Unknown fields {sorted(unknown)}.')
+        self.rows.append(tuple(
+            pk if field.primary_key
+            else convert(values[field.name]) if field.name in values
+            else field.get_db_prep_save(field.get_default(), self.connection)
+            for field, convert in self.fields
+        ))
+        for name, (field, convert) in self.m2m.items():
+            self.m2m_rows.setdefault(field, []).extend(
+                (pk, convert(related)) for related in values.get(name, ())
+            )
+        self.count += 1
+        if len(self.rows) >= FIXTURE_BATCH_SIZE:
+            self.flush()
+
+    def insert(self, table, columns, rows):
+        connection = self.connection
+        quote = connection.ops.quote_name
+        table, columns_sql = quote(table), ', '.join(map(quote, columns))
+        with connection.cursor() as cursor:
+            if not self.copy:
+                cursor.executemany(
+                    f'INSERT INTO {table} ({columns_sql}) '
+                    f'VALUES ({", ".join(["%s"] * len(columns))})',
+                    rows,
+                )
+                return
+            sql = f'COPY {table} ({columns_sql}) FROM STDIN'
+            with connection.wrap_database_errors, cursor.cursor.copy(
+                sql,
+            ) as copy:
+                for row in rows:
+                    copy.write_row(row)
+
+    def flush(self):
+        if self.rows:
+            self.insert(self.model._meta.db_table,
+                        [field.column for field, _ in self.fields], self.rows)
+        for field, rows in self.m2m_rows.items():
+            through = field.remote_field.through._meta
+            self.insert(through.db_table, [
+                through.get_field(field.m2m_field_name()).column,
+                through.get_field(field.m2m_reverse_field_name()).column,
+            ], rows)
+        self.rows, self.m2m_rows = [], {}
+
+    def load(self, stream):
+        """Restore objects of the fixture, return their count."""
+        connection = self.connection
+        with transaction.atomic(using=self.using):
+            with connection.constraint_checks_disabled():
+                for number, data in enumerate(read_fixture(stream), 1):
+                    try:
+                        self.add(data)
+                    except (LookupError, TypeError, ValueError,
+                            ValidationError) as error:
+                        raise ValueError(
+                            f'Object {number} ({data.get("model")}): {error}'
+                        ) from error
+                self.flush()
+            connection.check_constraints(table_names=sorted(self.tables))
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), self.models,
+                ):
+                    cursor.execute(sql)
+        return self.count
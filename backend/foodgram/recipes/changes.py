@@ -0,0 +1,151 @@
+"""A change feed keeping caches of all workers consistent.
+
+Signals are local to a process, so caches kept in every worker (the
+short-link index, the ingredient search index, count generations) only
+learn about changes made by the worker itself. `record()` writes a
+`Change` row (entity, object id, action) in the transaction of the change
+and applies it to this worker's caches once it commits. Every worker
+polls the feed at the start of a request at most every
+`CHANGE_FEED_POLL_SECONDS` (see `ChangeFeedMiddleware`) and applies
+changes of other workers, so a request never sees caches staler than that.
+
+The cursor of a worker is the id of the last applied change. Ids are
+allocated before commit, so a change may show up after changes with
+greater ids: changes newer than `CHANGE_FEED_SETTLE_SECONDS` are applied
+but the cursor stays before them until they settle. Only changes in
+transactions longer than that can be missed. Changes older than
+`CHANGE_FEED_KEEP_HOURS` are deleted by the workers.
+
+Applying a change is idempotent, so it's safe to apply one twice.
+"""
+import os
+import socket
+import threading
+from datetime import timedelta
+from functools import partial
+from time import monotonic
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from foodgram.constants import (
+    CHANGE_FEED_BATCH_SIZE, CHANGE_FEED_KEEP_HOURS, CHANGE_FEED_POLL_SECONDS,
+    CHANGE_FEED_PRUNE_SECONDS, CHANGE_FEED_SETTLE_SECONDS
+)
+from recipes import counts
+from recipes.ingredient_search import ingredient_index
+from recipes.models import Change
+from recipes.short_links import recipe_ids
+
+CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+
+# Entities, relations are named by their `default_related_name` and
+# identified by the id of their user.
+RECIPE, INGREDIENT, USER = 'recipe', 'ingredient', 'user'
+FAVORITES, SHOPPING_CARTS = 'favorites', 'shopping_carts'
+SUBSCRIPTIONS = 'subscriptions'
+
+HOST = socket.gethostname()
+
+
+def origin():
+    """Return the name of this process, taken after a fork."""
+    return f'{HOST}:{os.getpid()}'
+
+
+def apply(entity, object_id, action):
+    """Invalidate caches of this worker affected by the change."""
+    if entity == RECIPE:
+        if object_id is not None and action == CREATE:
+            recipe_ids.add(object_id)
+        elif object_id is not None and action == DELETE:
+            recipe_ids.discard(object_id)
+        if action != UPDATE:
+            counts.bump('recipes')
+    elif entity == INGREDIENT:
+        ingredient_index.invalidate()
+    elif entity == USER:
+        if action != UPDATE:
+            counts.bump('users')
+    elif entity in (FAVORITES, SHOPPING_CARTS, SUBSCRIPTIONS):
+        counts.bump(f'{entity}:{object_id}')
+
+
+def record(entity, object_id=None, action=UPDATE):
+    """Log the change for other workers, apply it here after commit."""
+    if settings.CHANGE_FEED:
+        Change.objects.create(entity=entity, object_id=object_id,
+                              action=action, origin=origin())
+    transaction.on_commit(partial(apply, entity, object_id, action))
+
+
+class ChangeFeed:
+    """The position of this worker in the feed, see the module."""
+
+    def __init__(self):
+        self.cursor = None    # Changes up to this id are applied.
+        self.applied = set()  # Ids of applied changes after the cursor.
+        self.polled_at = None
+        self.pruned_at = None
+        self.lock = threading.Lock()
+
+    def is_fresh(self):
+        return (self.polled_at is not None
+                and monotonic() - self.polled_at < CHANGE_FEED_POLL_SECONDS)
+
+    def poll(self):
+        """Apply new changes of other workers unless polled recently."""
+        if self.is_fresh():
+            return
+        with self.lock:
+            if self.is_fresh():  # Polled by another thread meanwhile.
+                return
+            polled_at = monotonic()
+            self.read()
+            self.polled_at = polled_at
+            if (self.pruned_at is None or polled_at - self.pruned_at
+                    > CHANGE_FEED_PRUNE_SECONDS):
+                self.prune()
+                self.pruned_at = polled_at
+
+    def read(self):
+        # Read from primary: replicas may lag behind the feed.
+        changes = Change.objects.using(DEFAULT_DB_ALIAS)
+        settled = timezone.now() - timedelta(
+            seconds=CHANGE_FEED_SETTLE_SECONDS,
+        )
+        if self.cursor is None:
+            # Caches of a new worker are loaded from the database, only
+            # changes which may still be committing are of interest.
+            self.cursor = changes.filter(created_at__lte=settled).aggregate(
+                cursor=Max('id'),
+            )['cursor'] or 0
+        own, last, advancing = origin(), self.cursor, True
+        while True:
+            batch = list(changes.filter(id__gt=last).values_list(
+                'id', 'entity', 'object_id', 'action', 'origin',
+                'created_at',
+            ).order_by('id')[:CHANGE_FEED_BATCH_SIZE])
+            for pk, entity, object_id, action, author, created_at in batch:
+                if pk not in self.applied:
+                    if author != own:
+                        apply(entity, object_id, action)
+                    self.applied.add(pk)
+                advancing = advancing and created_at <= settled
+                if advancing:
+                    self.cursor = pk
+            if len(batch) < CHANGE_FEED_BATCH_SIZE:
+                break
+            last = batch[-1][0]
+        self.applied = {x for x in self.applied if x > self.cursor}
+
+    @staticmethod
+    def prune():
+        Change.objects.filter(created_at__lt=timezone.now() - timedelta(
+            hours=CHANGE_FEED_KEEP_HOURS,
+        )).delete()
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,95 @@
+"""Cached and estimated counts of paginated lists.
+
+A count is cached under its list, normalized filters and, if they depend
+on the user, the viewer. It's stored with the generations of the scopes
+whose changes may change it (e.g. `recipes`, `favorites:<user id>`), read
+in the same `get_many` as the count: a count stored under older
+generations is recounted. `bump()` starts new generations of scopes,
+`recipes.changes` calls it when rows are added or deleted.
+
+With the default per-worker cache other workers see a bump when they poll
+the change feed, after at most `CHANGE_FEED_POLL_SECONDS` (or when their
+counts expire, after `COUNT_CACHE_SECONDS`, with the feed off); a shared
+cache backend in `CACHES['counts']` makes them exact.
+
+On PostgreSQL, counts of unfiltered lists may be taken from the planner
+statistics instead (`DB_COUNT_ESTIMATE=True`), for tables of at least
+`COUNT_ESTIMATE_MIN_ROWS` rows. Such counts are approximate: pages near
+the end may be missing or empty.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from foodgram.constants import COUNT_ESTIMATE_MIN_ROWS
+
+cache = caches['counts']
+
+
+def bump(*scopes):
+    """Start new generations of the scopes, outdating their counts."""
+    cache.set_many({f'generation:{x}': time.time_ns() for x in scopes},
+                   timeout=None)
+
+
+def count_key(name, params, viewer=None):
+    return 'count:' + hashlib.sha1(json.dumps(
+        [name, params, viewer], sort_keys=True,
+    ).encode()).hexdigest()
+
+
+def estimated_count(queryset):
+    """Return the planner's estimate of the rows of the queryset's table,
+    None if it isn't available or the table is small."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # -1 if the table was never analyzed.
+    if not row or row[0] < COUNT_ESTIMATE_MIN_ROWS:
+        return None
+    return int(row[0])
+
+
+def get_count(queryset, name, params=None, viewer=None, scopes=(),
+              estimate=False):
+    """Return the count of the queryset and whether it's an estimate.
+
+    :param name: name of the list.
+    :param params: normalized filters, {name: [values]}.
+    :param viewer: id of the user if the list depends on the user.
+    :param scopes: scopes whose changes may change the count.
+    :param estimate: whether the list is the whole table when unfiltered.
+    """
+    params = params or {}
+    if estimate and not params and settings.COUNT_ESTIMATE:
+        count = estimated_count(queryset)
+        if count is not None:
+            return count, True
+    key = count_key(name, params, viewer)
+    generation_keys = [f'generation:{x}' for x in scopes]
+    found = cache.get_many([key, *generation_keys])
+    generations = [found.get(x) for x in generation_keys]
+    if key in found and found[key][0] == generations:
+        return found[key][1], False
+    count = queryset.count()
+    cache.set(key, (generations, count))
+    return count, False
+
+
+def filter_params(filterset_class, query_params):
+    """Return {name: [sorted values]} of the filters given in the query."""
+    return {
+        name: sorted(query_params.getlist(name))
+        for name in sorted(filterset_class.base_filters)
+        if any(query_params.getlist(name))
+    }
@@ -0,0 +1,131 @@
+"""Typo-tolerant ingredient search ranked by trigram similarity.
+
+Names starting with the query come first, then names sharing enough of its
+trigrams, by similarity. On PostgreSQL this is `pg_trgm` word similarity
+(`<%`) served by a GIN index. Other databases use `ingredient_index`: an
+inverted trigram index kept in every worker, reloaded every
+`INGREDIENT_SEARCH_RELOAD_SECONDS` and on changes of ingredients made by
+any worker (see `recipes.changes`).
+Its similarity is the share of the query trigrams found in the name.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from math import ceil
+from time import monotonic
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from foodgram.constants import (
+    INGREDIENT_SEARCH_LIMIT, INGREDIENT_SEARCH_RELOAD_SECONDS,
+    INGREDIENT_SEARCH_THRESHOLD
+)
+
+WORD = re.compile(r'\w+')
+
+
+def trigrams(text):
+    """Return the set of trigrams of the text, as `pg_trgm` makes them."""
+    result = set()
+    for word in WORD.findall(text.lower()):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class IngredientIndex:
+    """Inverted trigram index of ingredient names, see module docstring."""
+
+    def __init__(self):
+        self.names = []     # Sorted (lowercase name, id) for prefix search.
+        self.postings = {}  # Trigram to the set of ids of names having it.
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def load(self, using):
+        from recipes.models import Ingredient
+
+        with self.lock:
+            if (self.loaded_at is not None and monotonic() - self.loaded_at
+                    < INGREDIENT_SEARCH_RELOAD_SECONDS):
+                return
+            loaded_at = monotonic()
+            names, postings = [], {}
+            for pk, name in Ingredient.objects.using(using).values_list(
+                'id', 'name',
+            ).iterator():
+                names.append((name.lower(), pk))
+                for trigram in trigrams(name):
+                    postings.setdefault(trigram, set()).add(pk)
+            names.sort()
+            self.names, self.postings = names, postings
+            self.loaded_at = loaded_at
+
+    def search(self, query, using):
+        """Return up to `INGREDIENT_SEARCH_LIMIT` best matching ids."""
+        self.load(using)
+        names, postings = self.names, self.postings
+        query = query.lower()
+
+        ranked = []
+        start = bisect_left(names, (query,))
+        for name, pk in names[start:start + INGREDIENT_SEARCH_LIMIT]:
+            if not name.startswith(query):
+                break
+            ranked.append(pk)
+        if len(ranked) == INGREDIENT_SEARCH_LIMIT:
+            return ranked
+
+        # Rarest trigrams first: a name missing all of the first
+        # `len - needed + 1` of them can't share `needed` trigrams.
+        lists = sorted((postings.get(trigram, ()) for trigram in
+                        trigrams(query)), key=len)
+        needed = ceil(INGREDIENT_SEARCH_THRESHOLD * len(lists))
+        rare = len(lists) - needed + 1
+        shared = Counter()
+        for ids in lists[:rare]:
+            shared.update(ids)
+        for left, ids in zip(range(len(lists) - rare, 0, -1),
+                             lists[rare:]):
+            # Drop names that can't get enough even with the rest.
+            shared = Counter({
+                pk: count + (pk in ids) for pk, count in shared.items()
+                if count + left >= needed
+            })
+        found = set(ranked)
+        similar = [(-count, pk) for pk, count in shared.items()
+                   if count >= needed and pk not in found]
+        similar.sort()
+        ranked += [pk for _, pk in similar[
+            :INGREDIENT_SEARCH_LIMIT - len(ranked)
+        ]]
+        return ranked
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_ingredients(queryset, query):
+    """Filter and order the ingredients queryset by the search query."""
+    if connections[queryset.db].vendor == 'postgresql':
+        prefix = Case(When(name__istartswith=query, then=Value(0)),
+                      default=Value(1), output_field=IntegerField())
+        return queryset.filter(
+            Q(name__istartswith=query) | Q(name__trigram_word_similar=query)
+        ).order_by(
+            prefix, TrigramWordSimilarity(query, 'name').desc(), 'name',
+        )[:INGREDIENT_SEARCH_LIMIT]
+
+    ids = ingredient_index.search(query, queryset.db)
+    if not ids:
+        return queryset.none()
+    return queryset.filter(id__in=ids).order_by(Case(
+        *(When(id=pk, then=Value(rank)) for rank, pk in enumerate(ids)),
+        output_field=IntegerField(),
+    ))
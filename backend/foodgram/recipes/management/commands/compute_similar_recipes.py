@@ -0,0 +1,22 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import compute
+
+
+class Command(BaseCommand):
+    help = ('Recompute similar recipes of recipes changed since the last '
+            'run (or all of them). Run it periodically.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute all recipes.')
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        count = compute(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated similar recipes of {count} recipes '
+            f'in {perf_counter() - start:.1f} s'
+        ))
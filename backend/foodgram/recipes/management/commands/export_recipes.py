@@ -0,0 +1,25 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.ndjson import export_recipes
+
+
+class Command(BaseCommand):
+    help = 'Export all recipes as NDJSON, see `recipes.ndjson`.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', default='-',
+                            help='Output file, stdout by default.')
+
+    def handle(self, *args, **options):
+        if options['file'] == '-':
+            for line in export_recipes():
+                sys.stdout.buffer.write(line)
+            return
+        count = 0
+        with open(options['file'], 'wb') as file:
+            for line in export_recipes():
+                file.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Exported {count} recipes'))
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+from recipes.bulk_fixtures import FixtureLoader
+
+
+class Command(BaseCommand):
+    help = ('Restore a JSON fixture in one transaction, much faster than '
+            '`loaddata`, see `recipes.bulk_fixtures`.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixture', help='Fixture file, `-` for stdin.')
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete rows of the restored tables first.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database to restore into.')
+
+    def handle(self, *args, **options):
+        loader = FixtureLoader(options['database'], options['flush'])
+        try:
+            if options['fixture'] == '-':
+                count = loader.load(sys.stdin)
+            else:
+                with open(options['fixture'], encoding='utf-8') as file:
+                    count = loader.load(file)
+        except (ValueError, DatabaseError) as error:
+            raise CommandError(f'Nothing restored: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Restored {count} objects of {len(loader.models)} models'
+        ))
@@ -0,0 +1,140 @@
+import json
+import os
+import time
+from pathlib import Path, PurePosixPath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from foodgram.constants import (
+    MEDIA_GC_CHECKPOINT_EVERY, MEDIA_GC_CHUNK_SIZE, MEDIA_GC_GRACE_HOURS
+)
+
+
+class Command(BaseCommand):
+    help = ('Delete media files not referenced by any model file field '
+            'and older than the grace period. Interrupted runs resume '
+            'from the checkpoint.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report orphans, don't delete them.")
+        parser.add_argument('--grace-hours', type=float,
+                            default=MEDIA_GC_GRACE_HOURS,
+                            help='Keep files modified more recently.')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Max files checked per second, 0 for '
+                                 'no limit.')
+        parser.add_argument('--checkpoint',
+                            default=Path(settings.BASE_DIR)
+                            / 'var/gc_media.checkpoint',
+                            help='File keeping the progress of a run.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint.')
+
+    @staticmethod
+    def referenced_names():
+        """Return hashes of file names stored in all file fields.
+
+        Hashes take a fraction of the memory of the names; a collision
+        only keeps an orphan.
+        """
+        names = set()
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if not isinstance(field, models.FileField):
+                    continue
+                names.update(
+                    hash(name) for name in
+                    model._default_manager.exclude(**{field.name: ''})
+                    .exclude(**{f'{field.name}__isnull': True})
+                    .values_list(field.name, flat=True)
+                    .iterator(chunk_size=MEDIA_GC_CHUNK_SIZE)
+                )
+        return names
+
+    def walk(self, directory, parts, after):
+        """Yield (parts, entry) of files in path order, past `after`."""
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        for entry in entries:
+            entry_parts = parts + (entry.name,)
+            if after and entry_parts < after[:len(entry_parts)]:
+                continue  # Checked by the previous run.
+            if entry.is_dir(follow_symlinks=False):
+                yield from self.walk(entry.path, entry_parts, after)
+            elif entry.is_file(follow_symlinks=False):
+                if after and entry_parts <= after:
+                    continue
+                yield entry_parts, entry
+
+    def save_checkpoint(self, path, parts, stats):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps({'after': parts, 'stats': stats}))
+        temporary.replace(path)
+
+    def delete_orphans(self, orphans, oldest, dry_run):
+        for name, path in orphans:
+            if self.verbosity >= 2:
+                self.stdout.write(name)
+            if dry_run:
+                continue
+            try:
+                # Reused by an upload since checked, see `foodgram.storage`.
+                if os.stat(path).st_mtime >= oldest:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        dry_run = options['dry_run']
+        checkpoint = Path(options['checkpoint'])
+        after, stats = (), {'checked': 0, 'orphans': 0, 'bytes': 0}
+        if checkpoint.exists() and not options['restart']:
+            state = json.loads(checkpoint.read_text())
+            after, stats = tuple(state['after']), state['stats']
+            self.stdout.write(f'Resuming after {"/".join(after)}')
+
+        referenced = self.referenced_names()
+        oldest = time.time() - options['grace_hours'] * 3600
+        interval = 1 / options['rate'] if options['rate'] else 0
+        next_check = time.monotonic()
+        orphans = []
+
+        for parts, entry in self.walk(settings.MEDIA_ROOT, (), after):
+            if interval:
+                delay = next_check - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_check = max(next_check, time.monotonic()) + interval
+            stats['checked'] += 1
+            name = str(PurePosixPath(*parts))
+            if hash(name) not in referenced:
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime < oldest:
+                    orphans.append((name, entry.path))
+                    stats['orphans'] += 1
+                    stats['bytes'] += stat.st_size
+            if (len(orphans) >= MEDIA_GC_CHUNK_SIZE
+                    or stats['checked'] % MEDIA_GC_CHECKPOINT_EVERY == 0):
+                self.delete_orphans(orphans, oldest, dry_run)
+                orphans = []
+                if not dry_run:
+                    self.save_checkpoint(checkpoint, parts, stats)
+        self.delete_orphans(orphans, oldest, dry_run)
+        if not dry_run:
+            checkpoint.unlink(missing_ok=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {stats["checked"]} files, '
+            f'{"found" if dry_run else "deleted"} {stats["orphans"]} orphans '
+            f'({stats["bytes"] / 2**20:.1f} MiB)'
+        ))
@@ -0,0 +1,43 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.constants import NDJSON_BATCH_SIZE
+from recipes.ndjson import RecipeImporter
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from NDJSON, see `recipes.ndjson`.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', default='-',
+                            help='Input file, stdin by default.')
+        parser.add_argument('--author', required=True,
+                            help='Email of the author of recipes whose '
+                                 'authors are unknown.')
+        parser.add_argument('--batch-size', type=int,
+                            default=NDJSON_BATCH_SIZE,
+                            help='Recipes written per query.')
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(email=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user {options["author"]}.')
+        importer = RecipeImporter(author, options['batch_size'])
+        if options['file'] == '-':
+            result = importer.feed(sys.stdin.buffer)
+        else:
+            with open(options['file'], 'rb') as file:
+                result = importer.feed(file)
+
+        for error in result['errors']:
+            self.stderr.write(f'Line {error["line"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result["created"]} recipes, '
+            f'{result["failed"]} failed'
+        ))
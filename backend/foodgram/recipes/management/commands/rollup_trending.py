@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import rollup
+
+
+class Command(BaseCommand):
+    help = ('Add new favorites and shopping cart additions to trending '
+            'scores of recipes. Run it periodically, e.g. every 5 minutes.')
+
+    def handle(self, *args, **options):
+        events, recipes = rollup()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {events} events of {recipes} recipes'
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32, verbose_name='Сущность')),
+                ('object_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID объекта')),
+                ('action', models.CharField(max_length=8, verbose_name='Действие')),
+                ('origin', models.CharField(max_length=128, verbose_name='Процесс')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Изменения',
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_change_feed'),
+    ]
+
+    operations = [
+        # Null for existing recipes: they're up to date in `SimilarRecipe`.
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_changed_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True, verbose_name='Дата изменения состава'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='ingredients_changed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, null=True, verbose_name='Дата изменения состава'),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
+from django.db import connections, models, router
+from django.utils import timezone
 
 from foodgram.constants import (
     USER_AVATAR_UPLOAD_TO, RECIPE_MIN_COOKING_TIME,
@@ -34,7 +35,8 @@ class User(AbstractUser):
     avatar = models.ImageField(
         verbose_name='Аватар',
         upload_to=USER_AVATAR_UPLOAD_TO,
-        blank=True
+        blank=True,
+        db_index=True,  # Shared files, see `foodgram.storage`.
     )
 
     USERNAME_FIELD = 'email'
@@ -55,6 +57,58 @@ class User(AbstractUser):
         return self.first_name
 
 
+class RelationQuerySet(models.QuerySet):
+    """Add and remove rows of a unique relation in one statement each.
+
+    No read before the write, so concurrent double clicks can't both pass
+    a check and collide. Like `bulk_create` these send no signals.
+    """
+
+    def get_connection(self):
+        return connections[self._db or router.db_for_write(self.model)]
+
+    def create_unless_exists(self, **values):
+        """Insert the row, return False if an equal one exists.
+
+        A missing related row raises `IntegrityError`: foreign keys are
+        checked at the end of the transaction, which is the statement
+        itself outside `atomic()`.
+        """
+        meta = self.model._meta
+        connection = self.get_connection()
+        obj = self.model(**values)
+        fields = [field for field in meta.local_concrete_fields
+                  if not field.primary_key]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(meta.db_table)} '
+                f'({", ".join(quote(field.column) for field in fields)}) '
+                f'VALUES ({", ".join(["%s"] * len(fields))}) '
+                f'ON CONFLICT DO NOTHING RETURNING {quote(meta.pk.column)}',
+                [field.get_db_prep_save(field.pre_save(obj, True), connection)
+                 for field in fields],
+            )
+            return cursor.fetchone() is not None
+
+    def delete_if_exists(self, **values):
+        """Delete the row, return False if there was none."""
+        meta = self.model._meta
+        connection = self.get_connection()
+        quote = connection.ops.quote_name
+        fields = [meta.get_field(name) for name in values]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote(meta.db_table)} WHERE '
+                + ' AND '.join(f'{quote(field.column)} = %s'
+                               for field in fields)
+                + f' RETURNING {quote(meta.pk.column)}',
+                [field.get_db_prep_save(value, connection)
+                 for field, value in zip(fields, values.values())],
+            )
+            return cursor.fetchone() is not None
+
+
 class Subscription(models.Model):
     """A user-to-author subscription model."""
 
@@ -73,6 +127,8 @@ class Subscription(models.Model):
         help_text='Пользователь, подписанный на автора.',
     )
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -120,6 +176,66 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Recipe queryset with helpers for the read API."""
+
+    def with_user_flags(self, user):
+        """Annotate `is_favorited` and `is_in_shopping_cart` for the user."""
+        if not user or not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                recipe=models.OuterRef('pk'), user=user,
+            )),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                recipe=models.OuterRef('pk'), user=user,
+            )),
+        )
+
+    def for_fragments(self, user):
+        """Fetch only what differs between users, see `api.fragments`.
+
+        Recipe contents come from the fragment cache, so only the key
+        (`id`, `updated_at`) and the user flags, including the author's
+        `is_subscribed`, are read.
+        """
+        if user and user.is_authenticated:
+            is_subscribed = models.Exists(Subscription.objects.filter(
+                author=models.OuterRef('author'), subscriber=user,
+            ))
+        else:
+            is_subscribed = models.Value(False)
+        return self.with_user_flags(user).annotate(
+            author_is_subscribed=is_subscribed,
+        ).only('id', 'author_id', 'updated_at')
+
+    def for_read(self, user):
+        """Fetch everything `ReadRecipeSerializer` needs in fixed queries.
+
+        Author's `is_subscribed` and user flags are annotated, ingredients
+        are prefetched, so serialization doesn't touch the database.
+        """
+        authors = User.objects.all()
+        if user and user.is_authenticated:
+            authors = authors.annotate(is_subscribed=models.Exists(
+                Subscription.objects.filter(
+                    author=models.OuterRef('pk'), subscriber=user,
+                )
+            ))
+        else:
+            authors = authors.annotate(is_subscribed=models.Value(False))
+        return self.with_user_flags(user).prefetch_related(
+            models.Prefetch('author', queryset=authors),
+            models.Prefetch(
+                'ingredients_amounts',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+        )
+
+
 class Recipe(models.Model):
     """A model of the recipe.
 
@@ -148,12 +264,30 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Изображение',
         upload_to=RECIPE_IMAGE_UPLOAD_TO,
+        db_index=True,  # Shared files, see `foodgram.storage`.
     )
     created_at = models.DateTimeField(
         verbose_name='Дата создания',
         auto_now_add=True,
         db_index=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    # Changed recipes for `recipes.similarity`: set when ingredients are
+    # added or removed or a similar recipe is deleted, unlike `updated_at`
+    # also touched by renames of the author and ingredients. Null for
+    # recipes unchanged since it's added.
+    ingredients_changed_at = models.DateTimeField(
+        verbose_name='Дата изменения состава',
+        default=timezone.now,
+        null=True,
+        editable=False,
+        db_index=True,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -216,6 +350,13 @@ class AbstractUserRecipe(models.Model):
         verbose_name='Рецепт',
         on_delete=models.CASCADE,
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,  # New events for `recipes.trending`.
+    )
+
+    objects = RelationQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -245,3 +386,138 @@ class ShoppingCart(AbstractUserRecipe):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_carts'
+
+
+class RecipeTrend(models.Model):
+    """Time-decayed popularity of a recipe, see `recipes.trending`."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='trend',
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    score = models.FloatField(
+        verbose_name='Популярность',
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        ordering = ('-score',)
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score}'
+
+
+class TrendRollup(models.Model):
+    """The state of `recipes.trending` rollups, a single row."""
+
+    epoch = models.DateTimeField(
+        verbose_name='Начало отсчета',
+    )
+    processed_until = models.DateTimeField(
+        verbose_name='Учтены события до',
+    )
+
+    class Meta:
+        verbose_name = 'Расчет популярности'
+        verbose_name_plural = 'Расчеты популярности'
+
+    def __str__(self):
+        return f'{self.epoch} - {self.processed_until}'
+
+
+class SimilarRecipe(models.Model):
+    """A recipe among the most similar to another one.
+
+    Computed by `recipes.similarity`.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='similar_recipes',
+        on_delete=models.CASCADE,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='uq_similar_recipe_recipe_similar',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='ix_similar_recipe_recipe_score'),
+        ]
+        ordering = ('recipe', '-score')
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.similar_id}: {self.score:.3f}'
+
+
+class SimilarityRollup(models.Model):
+    """The state of `recipes.similarity` runs, a single row."""
+
+    processed_until = models.DateTimeField(
+        verbose_name='Учтены изменения до',
+    )
+
+    class Meta:
+        verbose_name = 'Расчет похожих рецептов'
+        verbose_name_plural = 'Расчеты похожих рецептов'
+
+    def __str__(self):
+        return str(self.processed_until)
+
+
+# Change feed.
+class Change(models.Model):
+    """A change of cached data, polled by all workers.
+
+    See `recipes.changes`, the id is the cursor of the feed.
+    """
+
+    entity = models.CharField(
+        verbose_name='Сущность',
+        max_length=32,
+    )
+    object_id = models.BigIntegerField(
+        verbose_name='ID объекта',
+        null=True,
+        blank=True,
+    )
+    action = models.CharField(
+        verbose_name='Действие',
+        max_length=8,
+    )
+    origin = models.CharField(
+        verbose_name='Процесс',
+        max_length=128,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата',
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Изменения'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.id}: {self.action} {self.entity} {self.object_id}'
@@ -0,0 +1,207 @@
+"""Bulk export and import of recipes as NDJSON, one recipe per line:
+
+{"name": "...", "text": "...", "cooking_time": 10,
+ "author": "user@example.com", "created_at": "2025-05-07T22:38:00+00:00",
+ "image": "recipes/images/1.jpg",
+ "ingredients": [{"name": "соль", "measurement_unit": "г", "amount": 5}]}
+
+`image` is a file name in the media storage (files are moved separately)
+or a `data:image/...;base64,` URI. Ingredients are matched by name and
+unit, unknown authors are replaced by the importing user. Recipes are
+written in batches, so memory use doesn't depend on the input size.
+"""
+import json
+from datetime import datetime
+from pathlib import PurePosixPath
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.exceptions import ValidationError
+
+from foodgram.constants import (
+    NDJSON_BATCH_SIZE, NDJSON_MAX_ERRORS, RECIPE_INGREDIENT_MIN_AMOUNT,
+    RECIPE_MIN_COOKING_TIME
+)
+from recipes import changes
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+User = get_user_model()
+
+CONTENT_TYPE = 'application/x-ndjson'
+MAX_COOKING_TIME = 32767  # PositiveSmallIntegerField.
+NAME_MAX_LENGTH = Recipe._meta.get_field('name').max_length
+
+
+def export_queryset(queryset=None):
+    queryset = (Recipe.objects.all() if queryset is None else queryset)
+    return queryset.select_related('author').prefetch_related(
+        Prefetch('ingredients_amounts',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient',
+                 )),
+    ).order_by('id')
+
+
+def dump(recipe):
+    """Return the recipe as an NDJSON line (bytes)."""
+    return json.dumps({
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'author': recipe.author.email,
+        'created_at': recipe.created_at.isoformat(),
+        'image': recipe.image.name,
+        'ingredients': [
+            {
+                'name': x.ingredient.name,
+                'measurement_unit': x.ingredient.measurement_unit,
+                'amount': x.amount,
+            }
+            for x in recipe.ingredients_amounts.all()
+        ],
+    }, ensure_ascii=False).encode() + b'\n'
+
+
+def export_recipes(queryset=None):
+    """Yield recipes of the queryset as NDJSON lines (bytes)."""
+    for recipe in export_queryset(queryset).iterator(
+        chunk_size=NDJSON_BATCH_SIZE,
+    ):
+        yield dump(recipe)
+
+
+async def aexport_recipes(queryset=None):
+    """Async `export_recipes()`, for streaming under ASGI."""
+    async for recipe in export_queryset(queryset).aiterator(
+        chunk_size=NDJSON_BATCH_SIZE,
+    ):
+        yield dump(recipe)
+
+
+class RecipeImporter:
+    """Import NDJSON recipes, see the module docstring."""
+
+    def __init__(self, default_author, batch_size=NDJSON_BATCH_SIZE):
+        self.default_author = default_author
+        self.batch_size = batch_size
+        self.ingredient_ids = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        }
+        # (recipe, [(ingredient id, amount)], author email, created at).
+        self.batch = []
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def parse_image(self, image):
+        if not isinstance(image, str) or not image:
+            raise ValueError('`image` is required.')
+        if image.startswith('data:'):
+            try:
+                return Base64ImageField().to_internal_value(image)
+            except ValidationError:
+                raise ValueError('`image` is not a valid image.')
+        path = PurePosixPath(image)
+        if path.is_absolute() or '..' in path.parts:
+            raise ValueError('`image` must be a path in the media storage.')
+        return image
+
+    def parse_ingredients(self, ingredients):
+        if not isinstance(ingredients, list) or not ingredients:
+            raise ValueError('`ingredients` are required.')
+        amounts = {}
+        for x in ingredients:
+            key = (x.get('name'), x.get('measurement_unit'))
+            pk = self.ingredient_ids.get(key)
+            if pk is None:
+                raise ValueError(f'Unknown ingredient {key}.')
+            if pk in amounts:
+                raise ValueError(f'Duplicate ingredient {key}.')
+            amount = x.get('amount')
+            if (not isinstance(amount, int)
+                    or amount < RECIPE_INGREDIENT_MIN_AMOUNT):
+                raise ValueError(f'Invalid amount of {key}.')
+            amounts[pk] = amount
+        return list(amounts.items())
+
+    def parse(self, line):
+        """Return the unsaved recipe of the line and its ingredients."""
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            raise ValueError('A line must be a JSON object.')
+        name, text = data.get('name'), data.get('text')
+        if not isinstance(name, str) or not 0 < len(name) <= NAME_MAX_LENGTH:
+            raise ValueError(f'`name` must be 1-{NAME_MAX_LENGTH} '
+                             f'characters long.')
+        if not isinstance(text, str) or not text:
+            raise ValueError('`text` is required.')
+        cooking_time = data.get('cooking_time')
+        if (not isinstance(cooking_time, int)
+                or not RECIPE_MIN_COOKING_TIME <= cooking_time
+                <= MAX_COOKING_TIME):
+            raise ValueError('Invalid `cooking_time`.')
+        created_at = data.get('created_at')
+        recipe = Recipe(
+            name=name, text=text, cooking_time=cooking_time,
+            image=self.parse_image(data.get('image')),
+        )
+        return (recipe, self.parse_ingredients(data.get('ingredients')),
+                data.get('author'),
+                datetime.fromisoformat(created_at) if created_at else None)
+
+    def add_error(self, number, error):
+        self.error_count += 1
+        if len(self.errors) < NDJSON_MAX_ERRORS:
+            self.errors.append({'line': number, 'error': str(error)})
+
+    def flush(self):
+        """Save the batch: one query per table."""
+        if not self.batch:
+            return
+        emails = {email for _, _, email, _ in self.batch if email}
+        author_ids = dict(User.objects.filter(email__in=emails).values_list(
+            'email', 'id',
+        ))
+        for recipe, _, email, _ in self.batch:
+            recipe.author_id = author_ids.get(email, self.default_author.id)
+        with transaction.atomic():
+            Recipe.objects.bulk_create([x[0] for x in self.batch])
+            # `auto_now_add` overrides `created_at`, bring it back.
+            dated = []
+            for recipe, _, _, created_at in self.batch:
+                if created_at:
+                    recipe.created_at = created_at
+                    dated.append(recipe)
+            if dated:
+                Recipe.objects.bulk_update(dated, ['created_at'])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe_id=recipe.id, ingredient_id=pk,
+                                 amount=amount)
+                for recipe, ingredients, _, _ in self.batch
+                for pk, amount in ingredients
+            )
+            changes.record(changes.RECIPE, action=changes.CREATE)
+        self.created += len(self.batch)
+        self.batch = []
+
+    def feed(self, lines):
+        """Import NDJSON lines (str or bytes), skipping invalid ones."""
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                self.batch.append(self.parse(line))
+            except (ValueError, TypeError, AttributeError) as error:
+                self.add_error(number, error)
+                continue
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return self.result()
+
+    def result(self):
+        return {'created': self.created, 'failed': self.error_count,
+                'errors': self.errors}
@@ -0,0 +1,191 @@
+"""Shopping list files, rendered in place or by background jobs.
+
+A job sums the ingredients of the cart and renders the list in a local
+process pool instead of the request worker. Its id is the SHA-256 of the
+date and of the recipes in the cart with their `updated_at`, which moves
+with every edit the file shows (see `recipes.signals`), so the request
+only reads the cart and a job for a file already rendered finishes at
+once.
+
+Jobs belong to the user who started them. Their state is kept in files of
+`SHOPPING_LIST_DIR`, visible to all workers: `<user>-<id>.pending` while
+it runs, then `<user>-<id>.txt` or `<user>-<id>.failed`. A job pending
+longer than `SHOPPING_LIST_JOB_TIMEOUT` is lost (its worker was
+restarted) and counts as failed. Files older than
+`SHOPPING_LIST_KEEP_HOURS` are deleted by the jobs.
+
+Pool processes are spawned, not forked, and set up Django to query the
+database. A pool broken by a dead process fails its jobs and is replaced
+on the next submit.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+import django
+from django.db import close_old_connections
+from django.db.models import F, Sum
+
+from foodgram.constants import (
+    SHOPPING_LIST_JOB_TIMEOUT, SHOPPING_LIST_KEEP_HOURS,
+    SHOPPING_LIST_PROCESSES
+)
+from recipes.models import Recipe, RecipeIngredient, ShoppingCart
+
+PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+SUFFIXES = {PENDING: '.pending', DONE: '.txt', FAILED: '.failed'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def format_text(date, recipes, ingredients):
+    """Return the list of [(name, author)] recipes and [{name, unit,
+    amount}] ingredients."""
+    return '\n'.join([
+        f'Список покупок от {date}:',
+        '\nВы хотели приготовить:',
+        *[f'{i}. {name}, автор: {author})'
+          for i, (name, author) in enumerate(recipes, 1)],
+        '\nКупить:',
+        *[f'{i}. {x["name"]} — {x["amount"]} {x["unit"]}'
+          for i, x in enumerate(ingredients, 1)],
+    ]) if ingredients else 'Список покупок пуст.'
+
+
+def get_contents(user_id):
+    """Return the date, recipes and ingredients of the user`s list."""
+    recipes = Recipe.objects.filter(
+        shopping_carts__user=user_id
+    ).distinct().select_related('author')
+    ingredients = (
+        RecipeIngredient.objects
+        .filter(recipe__in=ShoppingCart.objects.filter(
+            user=user_id
+        ).values('recipe'))
+        .values(name=F('ingredient__name'),
+                unit=F('ingredient__measurement_unit'))
+        .annotate(amount=Sum('amount'))
+        .order_by('name')
+    )
+    return (
+        datetime.now().strftime('%d.%m.%Y'),
+        [(x.name, str(x.author)) for x in recipes],
+        list(ingredients),
+    )
+
+
+def job_id(user_id):
+    """Return the id of the job rendering the user's current list."""
+    versions = ShoppingCart.objects.filter(user=user_id).order_by(
+        'recipe',
+    ).values_list('recipe', 'recipe__updated_at')
+    return hashlib.sha256(json.dumps(
+        [datetime.now().strftime('%d.%m.%Y'),
+         [(pk, updated_at.isoformat()) for pk, updated_at in versions]],
+    ).encode()).hexdigest()
+
+
+def job_path(directory, user_id, pk, status):
+    return Path(directory) / f'{user_id}-{pk}{SUFFIXES[status]}'
+
+
+def get_status(directory, user_id, pk):
+    """Return the status of the user's job, None if there is no such job."""
+    if job_path(directory, user_id, pk, DONE).exists():
+        return DONE
+    try:
+        started = job_path(directory, user_id, pk, PENDING).stat().st_mtime
+    except FileNotFoundError:
+        if job_path(directory, user_id, pk, FAILED).exists():
+            return FAILED
+        return None
+    if time.time() - started > SHOPPING_LIST_JOB_TIMEOUT:
+        return FAILED
+    return PENDING
+
+
+def render(directory, user_id, pk):
+    """Write the file of the job, run in a pool process."""
+    close_old_connections()
+    try:
+        temporary = Path(directory) / f'{user_id}-{pk}.{os.getpid()}.tmp'
+        temporary.write_text(format_text(*get_contents(user_id)),
+                             encoding='utf-8')
+        temporary.replace(job_path(directory, user_id, pk, DONE))
+    except Exception as error:
+        fail(directory, user_id, pk, error)
+    finally:
+        job_path(directory, user_id, pk, PENDING).unlink(missing_ok=True)
+        close_old_connections()
+    delete_old(directory)
+
+
+def fail(directory, user_id, pk, error):
+    job_path(directory, user_id, pk, FAILED).write_text(repr(error))
+
+
+def check_job(directory, user_id, pk, future):
+    """Fail a job the pool lost, e.g. because its process died."""
+    error = future.exception()
+    if error is not None:
+        fail(directory, user_id, pk, error)
+        job_path(directory, user_id, pk, PENDING).unlink(missing_ok=True)
+
+
+def delete_old(directory):
+    """Delete files of jobs finished long ago."""
+    oldest = time.time() - SHOPPING_LIST_KEEP_HOURS * 3600
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < oldest:
+                    os.unlink(entry.path)
+            except FileNotFoundError:  # Deleted by another job.
+                pass
+
+
+def submit(*args):
+    """Submit a call to the pool, replacing it if it's broken."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            try:
+                return _executor.submit(*args)
+            except BrokenProcessPool:
+                _executor.shutdown(wait=False)
+        _executor = ProcessPoolExecutor(
+            max_workers=SHOPPING_LIST_PROCESSES,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+        return _executor.submit(*args)
+
+
+def start(directory, user_id):
+    """Start a job rendering the user's list unless it's rendered or
+    running.
+
+    :return: the job id and its status.
+    """
+    pk = job_id(user_id)
+    status = get_status(directory, user_id, pk)
+    if status in (DONE, PENDING):
+        if status == DONE:  # Keep it from being deleted as old.
+            job_path(directory, user_id, pk, DONE).touch()
+        return pk, status
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    job_path(directory, user_id, pk, FAILED).unlink(missing_ok=True)
+    job_path(directory, user_id, pk, PENDING).touch()
+    submit(render, directory, user_id, pk).add_done_callback(
+        partial(check_job, directory, user_id, pk),
+    )
+    return pk, PENDING
@@ -0,0 +1,170 @@
+"""Short links to recipes: compact codes and a DB-free existence check.
+
+A code is a recipe id permuted by a keyed Feistel network over 40 bits and
+written as 7 characters: a letter and 6 base62 digits. Codes don't reveal
+neighbouring ids, and since they never consist of digits only, old numeric
+links (`/s/<id>/`) keep working next to them.
+
+`recipe_ids` keeps a bitmap of live recipe ids in every worker. It is loaded
+once and updated by changes of all workers (see `recipes.changes`). As a
+fallback it's topped up with new ids at most every
+`SHORT_LINK_REFRESH_SECONDS` on a miss and reloaded completely every
+`SHORT_LINK_RELOAD_SECONDS`.
+"""
+import re
+import string
+import threading
+from hashlib import blake2b
+from time import monotonic
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from foodgram.constants import (
+    SHORT_LINK_REFRESH_SECONDS, SHORT_LINK_RELOAD_SECONDS
+)
+
+
+BASE62 = string.digits + string.ascii_letters
+CODE_REGEX = '[a-zA-Z][0-9a-zA-Z]{6}'
+HALF_BITS = 20
+HALF_MASK = (1 << HALF_BITS) - 1
+MAX_ID = (1 << HALF_BITS * 2) - 1
+ROUNDS = 4
+
+
+def _round(half, number):
+    """Keyed round function of the Feistel network."""
+    digest = blake2b(
+        half.to_bytes(3, 'big') + bytes((number,)),
+        key=settings.SECRET_KEY.encode()[:64],
+        digest_size=3,
+        person=b'short-link',
+    ).digest()
+    return int.from_bytes(digest, 'big') & HALF_MASK
+
+
+def encode(recipe_id):
+    """Return the short code of the recipe id."""
+    if not 0 < recipe_id <= MAX_ID:
+        raise ValueError(f'Recipe id {recipe_id} is out of range.')
+    left, right = recipe_id >> HALF_BITS, recipe_id & HALF_MASK
+    for number in range(ROUNDS):
+        left, right = right, left ^ _round(right, number)
+    value = left << HALF_BITS | right
+
+    head, tail = divmod(value, 62 ** 6)
+    digits = []
+    for _ in range(6):
+        tail, digit = divmod(tail, 62)
+        digits.append(BASE62[digit])
+    return string.ascii_letters[head] + ''.join(reversed(digits))
+
+
+def decode(code):
+    """Return the recipe id of the short code, `ValueError` if invalid."""
+    if not re.fullmatch(CODE_REGEX, code):
+        raise ValueError(f'Invalid short code {code!r}.')
+    value = string.ascii_letters.index(code[0])
+    for char in code[1:]:
+        value = value * 62 + BASE62.index(char)
+    if value > MAX_ID:
+        raise ValueError(f'Invalid short code {code!r}.')
+
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for number in reversed(range(ROUNDS)):
+        left, right = right ^ _round(left, number), left
+    recipe_id = left << HALF_BITS | right
+    if not recipe_id:
+        raise ValueError(f'Invalid short code {code!r}.')
+    return recipe_id
+
+
+class ShortCodeConverter:
+    """URL converter between short codes and recipe ids."""
+
+    regex = CODE_REGEX
+
+    def to_python(self, value):
+        return decode(value)
+
+    def to_url(self, value):
+        return encode(int(value))
+
+
+class RecipeIdIndex:
+    """A bitmap of live recipe ids, see the module docstring."""
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.loaded_up_to = 0  # Ids up to this one are known exactly.
+        self.loaded_at = None
+        self.refreshed_at = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _set(bits, recipe_id):
+        index, bit = divmod(recipe_id, 8)
+        if index >= len(bits):
+            bits.extend(bytes(index - len(bits) + 1))
+        bits[index] |= 1 << bit
+
+    def add(self, recipe_id):
+        self._set(self.bits, recipe_id)
+
+    def discard(self, recipe_id):
+        index, bit = divmod(recipe_id, 8)
+        if index < len(self.bits):
+            self.bits[index] &= ~(1 << bit) & 0xFF
+
+    def lookup(self, recipe_id):
+        """Whether the recipe exists, `None` if `refresh()` is needed."""
+        now = monotonic()
+        if (self.loaded_at is None
+                or now - self.loaded_at > SHORT_LINK_RELOAD_SECONDS):
+            return None
+        index, bit = divmod(recipe_id, 8)
+        if index < len(self.bits) and self.bits[index] >> bit & 1:
+            return True
+        if recipe_id <= self.loaded_up_to:
+            return False
+        # Maybe it was just created by another worker.
+        if now - self.refreshed_at > SHORT_LINK_REFRESH_SECONDS:
+            return None
+        return False
+
+    def refresh(self):
+        """Load all ids if the bitmap is stale, else only the new ones."""
+        from recipes.models import Recipe
+
+        with self.lock:
+            now = monotonic()
+            reload = (self.loaded_at is None
+                      or now - self.loaded_at > SHORT_LINK_RELOAD_SECONDS)
+            # Read from primary: replicas may lag behind new recipes.
+            ids = Recipe.objects.using(DEFAULT_DB_ALIAS).values_list(
+                'id', flat=True,
+            ).order_by('id')
+            if reload:
+                # Fill a new bitmap, lookups keep using the old one.
+                bits, loaded_up_to = bytearray(), 0
+            else:
+                bits, loaded_up_to = self.bits, self.loaded_up_to
+                ids = ids.filter(id__gt=loaded_up_to)
+            for recipe_id in ids.iterator():
+                self._set(bits, recipe_id)
+                loaded_up_to = recipe_id
+            self.bits, self.loaded_up_to = bits, loaded_up_to
+            if reload:
+                self.loaded_at = now
+            self.refreshed_at = now
+
+    def __contains__(self, recipe_id):
+        found = self.lookup(recipe_id)
+        if found is None:
+            self.refresh()
+            found = self.lookup(recipe_id)
+        return found
+
+
+recipe_ids = RecipeIdIndex()
@@ -0,0 +1,147 @@
+from functools import partial
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes import changes
+from recipes.models import (
+    Favorite, Ingredient, Recipe, ShoppingCart, Subscription, User
+)
+
+
+# Fields of authors shown in recipes, see `api.fragments`.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name', 'avatar'}
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, update_fields, raw,
+                         **kwargs):
+    """Change the versions of cached recipe fragments showing the author.
+
+    Saves of other fields only, e.g. `last_login`, are skipped.
+    """
+    if (raw or created
+            or update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    Recipe.objects.filter(author=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, raw, **kwargs):
+    """Change the versions of cached recipe fragments showing the
+    ingredient."""
+    if not created and not raw:
+        Recipe.objects.filter(ingredients=instance).update(
+            updated_at=timezone.now(),
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def requeue_similar_recipes(sender, instance, **kwargs):
+    """Queue recipes listing the deleted one for `recipes.similarity`,
+    their lists would stay a recipe short."""
+    Recipe.objects.filter(similar_recipes__similar=instance).update(
+        ingredients_changed_at=timezone.now(),
+    )
+
+
+# Changes of cached data: applied to this worker's caches (short links,
+# ingredient search, counts of lists) after commit and logged for other
+# workers, see `recipes.changes`. The API adds and removes favorites, cart
+# items and subscriptions without signals and records them itself. Fixture
+# loads (`raw` saves) aren't recorded, like `fast_restore` which sends no
+# signals: restart the workers after loading data.
+ENTITIES = {
+    Recipe: changes.RECIPE,
+    Ingredient: changes.INGREDIENT,
+    User: changes.USER,
+}
+
+
+def get_action(created):
+    """Return the action of `post_save` (which sends `created`) or
+    `post_delete`."""
+    if created is None:
+        return changes.DELETE
+    return changes.CREATE if created else changes.UPDATE
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def record_change(sender, instance, created=None, update_fields=None,
+                  raw=False, **kwargs):
+    if raw:
+        return
+    if (sender is User and update_fields
+            and not AUTHOR_FIELDS & set(update_fields)):
+        return  # E.g. `last_login`.
+    changes.record(ENTITIES[sender], instance.pk, get_action(created))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def record_user_recipe_change(sender, instance, created=None, raw=False,
+                              **kwargs):
+    if raw:
+        return
+    changes.record(sender._meta.default_related_name, instance.user_id,
+                   get_action(created))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def record_subscription_change(sender, instance, created=None, raw=False,
+                               **kwargs):
+    if raw:
+        return
+    changes.record(changes.SUBSCRIPTIONS, instance.subscriber_id,
+                   get_action(created))
+
+
+# Files of objects, released after commit when replaced or deleted. The
+# storage deletes a file once no object refers to it, see
+# `foodgram.storage`.
+FILE_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+def release_file(name):
+    if name:
+        transaction.on_commit(partial(default_storage.delete, name))
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_file(sender, instance, update_fields, **kwargs):
+    """Keep the name of the file the save may replace."""
+    field = FILE_FIELDS[sender]
+    if (instance._state.adding
+            or update_fields and field not in update_fields):
+        return
+    instance._replaced_file = sender.objects.filter(
+        pk=instance.pk,
+    ).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def release_replaced_file(sender, instance, **kwargs):
+    name = instance.__dict__.pop('_replaced_file', None)
+    if name != getattr(instance, FILE_FIELDS[sender]).name:
+        release_file(name)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_deleted_file(sender, instance, **kwargs):
+    release_file(getattr(instance, FILE_FIELDS[sender]).name)
@@ -0,0 +1,162 @@
+"""Similar recipes: top ingredient overlap, computed in batches.
+
+Recipes are sparse vectors over ingredients weighted by IDF, similarity is
+their cosine. It's computed as the sparse product of the recipe x
+ingredient matrix and its transpose, one row at a time: candidates of a
+recipe are collected from the inverted index (ingredient -> recipes), so
+only pairs sharing an ingredient are touched. Ingredients used by more than
+`SIMILAR_MAX_DF_SHARE` of recipes (salt, water) aren't indexed: they add
+little to scores and most of the work; they still count for candidates
+found by rarer ones.
+
+The top `SIMILAR_RECIPES_COUNT` of every recipe are stored in
+`SimilarRecipe`. Later runs recompute recipes whose ingredients were
+added or removed (by `ingredients_changed_at`, also set on recipes whose
+lists lose a deleted recipe) and recipes whose lists they enter or leave;
+`full=True` recomputes all, e.g. to follow IDF drift.
+"""
+import heapq
+import math
+from array import array
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from foodgram.constants import (
+    SIMILAR_BATCH_SIZE, SIMILAR_LAG_SECONDS, SIMILAR_MAX_DF_SHARE,
+    SIMILAR_RECIPES_COUNT
+)
+from recipes.models import (
+    Recipe, RecipeIngredient, SimilarityRollup, SimilarRecipe
+)
+
+
+class Corpus:
+    """Recipe vectors and the inverted index of all recipes."""
+
+    def __init__(self):
+        self.recipes = defaultdict(set)  # Recipe id to ingredient ids.
+        for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id',
+        ).order_by().iterator(chunk_size=SIMILAR_BATCH_SIZE * 10):
+            self.recipes[recipe_id].add(ingredient_id)
+        self.recipes = {pk: frozenset(x) for pk, x in self.recipes.items()}
+
+        frequencies = Counter(
+            x for ingredients in self.recipes.values() for x in ingredients
+        )
+        count = len(self.recipes)
+        self.weights = {  # Squared IDF weights.
+            x: math.log(count / frequency + 1) ** 2
+            for x, frequency in frequencies.items()
+        }
+        self.norms = {
+            pk: math.sqrt(sum(self.weights[x] for x in ingredients))
+            for pk, ingredients in self.recipes.items()
+        }
+        max_frequency = max(1, int(count * SIMILAR_MAX_DF_SHARE))
+        self.index = defaultdict(lambda: array('L'))
+        for pk, ingredients in self.recipes.items():
+            for x in ingredients:
+                if frequencies[x] <= max_frequency:
+                    self.index[x].append(pk)
+        self.index = dict(self.index)
+
+    def scores(self, recipe_id):
+        """Return {recipe id: cosine similarity} of candidates."""
+        ingredients = self.recipes.get(recipe_id)
+        if not ingredients:
+            return {}
+        dots = defaultdict(float)
+        common = []
+        for x in ingredients:
+            recipes = self.index.get(x)
+            if recipes is None:
+                common.append(x)
+                continue
+            weight = self.weights[x]
+            for pk in recipes:
+                dots[pk] += weight
+        dots.pop(recipe_id, None)
+        norm = self.norms[recipe_id]
+        for pk in dots:
+            other = self.recipes[pk]
+            dots[pk] = (dots[pk] + sum(
+                self.weights[x] for x in common if x in other
+            )) / (norm * self.norms[pk])
+        return dots
+
+    @staticmethod
+    def top(scores):
+        return heapq.nlargest(SIMILAR_RECIPES_COUNT, scores.items(),
+                              key=lambda item: item[1])
+
+
+@transaction.atomic
+def save(tops):
+    """Replace stored lists by {recipe id: [(similar id, score)]}."""
+    SimilarRecipe.objects.filter(recipe_id__in=list(tops)).delete()
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=pk, similar_id=similar, score=score)
+        for pk, top in tops.items() for similar, score in top
+    )
+
+
+def affected(corpus, changed):
+    """Return changed recipes and those whose lists they enter or leave."""
+    stored = {
+        x['recipe_id']: (x['count'], x['min_score'])
+        for x in SimilarRecipe.objects.values('recipe_id').annotate(
+            count=Count('id'), min_score=Min('score'),
+        ).order_by()
+    }
+    result = set(changed) | set(SimilarRecipe.objects.filter(
+        similar_id__in=changed,
+    ).values_list('recipe_id', flat=True))
+    for pk in changed:
+        for other, score in corpus.scores(pk).items():
+            count, min_score = stored.get(other, (0, 0))
+            if count < SIMILAR_RECIPES_COUNT or score > min_score:
+                result.add(other)
+    return result
+
+
+def compute(full=False, now=None):
+    """Recompute similar recipes, return the number of recipes updated.
+
+    Changes of the last `SIMILAR_LAG_SECONDS` are left for the next run:
+    transactions making them may be not committed yet. Lists are replaced
+    and committed in batches of `SIMILAR_BATCH_SIZE` recipes, so readers
+    see them updated as the run goes and locks are held briefly; a failed
+    run is redone by the next one.
+    """
+    until = (now or timezone.now()) - timedelta(seconds=SIMILAR_LAG_SECONDS)
+    state = SimilarityRollup.objects.first()
+    full = full or state is None
+    if not full and until <= state.processed_until:
+        return 0
+    corpus = Corpus()
+    if full:  # Recipes without ingredients too, their lists are emptied.
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    else:
+        recipe_ids = affected(corpus, list(Recipe.objects.filter(
+            ingredients_changed_at__gt=state.processed_until,
+            ingredients_changed_at__lte=until,
+        ).values_list('id', flat=True)))
+
+    tops, count = {}, 0
+    for pk in recipe_ids:
+        tops[pk] = corpus.top(corpus.scores(pk))
+        if len(tops) >= SIMILAR_BATCH_SIZE:
+            save(tops)
+            count += len(tops)
+            tops = {}
+    save(tops)
+    count += len(tops)
+    state = state or SimilarityRollup()
+    state.processed_until = until
+    state.save()
+    return count
@@ -0,0 +1,88 @@
+"""Trending recipes: popularity decayed by time, rolled up periodically.
+
+Every favorite and shopping cart addition adds its weight to the recipe's
+score, halving every `TRENDING_HALF_LIFE_HOURS`. Scores are stored relative
+to a fixed `epoch`, as `weight * 2 ** ((added - epoch) / half_life)`: the
+decay of all scores by the same factor doesn't change their order, so a
+rollup only adds the events since the previous one to their recipes'
+`RecipeTrend` rows. When the exponents grow large, scores are rebased to a
+new epoch and the faded ones are dropped.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from foodgram.constants import (
+    TRENDING_BATCH_SIZE, TRENDING_HALF_LIFE_HOURS, TRENDING_LAG_SECONDS,
+    TRENDING_MIN_SCORE, TRENDING_REBASE_HALF_LIVES, TRENDING_WEIGHTS
+)
+from recipes.models import Favorite, RecipeTrend, ShoppingCart, TrendRollup
+
+HALF_LIFE = timedelta(hours=TRENDING_HALF_LIFE_HOURS)
+EVENTS = ((Favorite, TRENDING_WEIGHTS['favorite']),
+          (ShoppingCart, TRENDING_WEIGHTS['shopping_cart']))
+
+
+def rebase(state, epoch):
+    """Move scores to the new epoch, drop the faded ones."""
+    factor = 2 ** -((epoch - state.epoch) / HALF_LIFE)
+    RecipeTrend.objects.update(score=F('score') * factor)
+    RecipeTrend.objects.filter(score__lt=TRENDING_MIN_SCORE).delete()
+    state.epoch = epoch
+
+
+def add_scores(deltas):
+    """Add the score deltas {recipe id: delta} to the recipes' rows."""
+    ids = list(deltas)
+    for start in range(0, len(ids), TRENDING_BATCH_SIZE):
+        chunk = ids[start:start + TRENDING_BATCH_SIZE]
+        scores = dict(RecipeTrend.objects.filter(
+            recipe_id__in=chunk,
+        ).values_list('recipe_id', 'score'))
+        RecipeTrend.objects.bulk_create(
+            [RecipeTrend(recipe_id=pk, score=scores.get(pk, 0) + deltas[pk])
+             for pk in chunk],
+            update_conflicts=True,
+            unique_fields=['recipe'],
+            update_fields=['score'],
+        )
+
+
+def rollup(now=None):
+    """Add events since the previous rollup, return (events, recipes).
+
+    Events of the last `TRENDING_LAG_SECONDS` are left for the next run:
+    transactions adding them may be not committed yet.
+    """
+    until = (now or timezone.now()) - timedelta(seconds=TRENDING_LAG_SECONDS)
+    with transaction.atomic():
+        state = TrendRollup.objects.select_for_update().first()
+        if state is None:
+            # Older events would add less than 2 ** -REBASE_HALF_LIVES.
+            state = TrendRollup(
+                epoch=until,
+                processed_until=until - HALF_LIFE * TRENDING_REBASE_HALF_LIVES,
+            )
+        elif until - state.epoch > HALF_LIFE * TRENDING_REBASE_HALF_LIVES:
+            rebase(state, until)
+        if until <= state.processed_until:
+            return 0, 0
+
+        deltas, events = defaultdict(float), 0
+        for model, weight in EVENTS:
+            for recipe_id, created_at in model.objects.filter(
+                created_at__gt=state.processed_until, created_at__lte=until,
+            ).values_list('recipe_id', 'created_at').iterator(
+                chunk_size=TRENDING_BATCH_SIZE,
+            ):
+                deltas[recipe_id] += weight * 2 ** (
+                    (created_at - state.epoch) / HALF_LIFE
+                )
+                events += 1
+        add_scores(deltas)
+        state.processed_until = until
+        state.save()
+    return events, len(deltas)
@@ -1,10 +1,15 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, register_converter
 
-from recipes.views import get_recipe
+from recipes.short_links import ShortCodeConverter
+from recipes.views import aget_recipe, get_recipe
 
 
 app_name = 'recipes'
+register_converter(ShortCodeConverter, 'short_code')
+view = aget_recipe if settings.ASYNC_READ_VIEWS else get_recipe
 
 urlpatterns = [
-    path('s/<int:recipe_id>/', get_recipe, name='get_recipe'),
+    path('s/<short_code:recipe_id>/', view, name='get_recipe'),
+    path('s/<int:recipe_id>/', view, name='get_recipe_by_id'),  # Old links.
 ]
@@ -1,8 +1,22 @@
-from django.shortcuts import get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import redirect
 
-from recipes.models import Recipe
+from recipes.short_links import recipe_ids
 
 
 def get_recipe(request, recipe_id):
-    get_object_or_404(Recipe, pk=recipe_id)
+    if recipe_id not in recipe_ids:
+        raise Http404('No Recipe matches the given query.')
+    return redirect(f'/recipes/{recipe_id}')
+
+
+async def aget_recipe(request, recipe_id):
+    """Async `get_recipe`, used in ASGI mode."""
+    found = recipe_ids.lookup(recipe_id)
+    if found is None:
+        await sync_to_async(recipe_ids.refresh)()
+        found = recipe_ids.lookup(recipe_id)
+    if not found:
+        raise Http404('No Recipe matches the given query.')
     return redirect(f'/recipes/{recipe_id}')
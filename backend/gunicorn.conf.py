@@ -0,0 +1,26 @@
+"""Gunicorn settings added to the command line in the Dockerfile.
+
+With GUNICORN_PRELOAD=True (default) the application is loaded and warmed
+up (see `foodgram.startup`) once in the master before forking workers: new
+workers take requests right away and share its memory copy-on-write.
+The garbage collector would write to every object it scans, copying their
+pages, so it's off in the master and the objects existing at fork are
+frozen out of its reach.
+"""
+import gc
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+if preload_app:
+    gc.disable()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
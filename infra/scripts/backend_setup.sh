@@ -37,6 +37,8 @@ if $DO_STATIC; then
     docker compose exec backend python foodgram/manage.py collectstatic --no-input --clear
     STATIC_SIZE=$(docker compose exec backend du -sh /app/foodgram/static | cut -f1)
     echo "Collected. Size: ${STATIC_SIZE}."
+    echo "Compressing static files and API docs..."
+    docker compose exec backend python foodgram/manage.py precompress /app/foodgram/static /app/docs
 fi
 
 echo -e "\n\033[32m✓ Backend ready\033[0m"
\ No newline at end of file